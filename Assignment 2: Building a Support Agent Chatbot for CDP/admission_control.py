@@ -0,0 +1,191 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a request cannot finish before its deadline."""
+
+    def __init__(self, stage=None):
+        self.stage = stage
+        message = "Request deadline exceeded"
+        if stage:
+            message += f" during {stage}"
+        super().__init__(message)
+
+
+class Deadline:
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self.expires_at = time.monotonic() + timeout
+
+    def remaining(self):
+        """Seconds left before the deadline (never negative)."""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        """Check whether the deadline has already passed."""
+        return time.monotonic() >= self.expires_at
+
+    def check(self, stage=None):
+        """Raise DeadlineExceeded if the deadline has passed."""
+        if self.expired():
+            raise DeadlineExceeded(stage)
+
+
+# LLM calls abandoned by the request admitted on this thread that are still running
+_abandoned = threading.local()
+
+
+def hold_slot_until(future):
+    """Keep the current request's admission slot until an abandoned call finishes.
+
+    A running LLM call cannot be cancelled, so when a request gives up on one
+    the backend is still busy with it. Holding the slot keeps in_flight and
+    retry_after() honest and stops the next request from queueing behind it.
+    Does nothing outside an admitted block.
+    """
+    held = getattr(_abandoned, "futures", None)
+    if held is not None:
+        held.append(future)
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed instead of being admitted."""
+
+    status_code = 503
+
+    def __init__(self, message, retry_after):
+        self.retry_after = retry_after
+        super().__init__(message)
+
+
+class QueueFull(AdmissionRejected):
+    status_code = 429
+
+
+class QueueTimeout(AdmissionRejected):
+    status_code = 503
+
+
+class AdmissionController:
+    def __init__(self, max_concurrent=4, max_queue=16, queue_timeout=10.0):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+
+        # Counters exposed through stats()
+        self.in_flight = 0
+        self.queued = 0
+        self.max_queued = 0
+        self.admitted = 0
+        self.completed = 0
+        self.shed_queue_full = 0
+        self.shed_queue_timeout = 0
+        self.deadline_exceeded = 0
+
+        # Moving average of how long an admitted request holds its slot
+        self.avg_service_time = 1.0
+
+    def retry_after(self):
+        """Estimate how many seconds a shed client should wait before retrying."""
+        with self._lock:
+            backlog = self.queued + self.in_flight
+            avg = self.avg_service_time
+        return max(1, math.ceil(avg * backlog / self.max_concurrent))
+
+    def _acquire(self, deadline=None):
+        # Fast path: a slot is free, no queueing needed
+        if self._slots.acquire(blocking=False):
+            return
+
+        with self._lock:
+            if self.queued >= self.max_queue:
+                self.shed_queue_full += 1
+                rejected = True
+            else:
+                self.queued += 1
+                self.max_queued = max(self.max_queued, self.queued)
+                rejected = False
+
+        if rejected:
+            raise QueueFull("Too many requests waiting", self.retry_after())
+
+        timeout = self.queue_timeout
+        if deadline is not None:
+            timeout = min(timeout, deadline.remaining())
+
+        acquired = self._slots.acquire(timeout=timeout)
+
+        with self._lock:
+            self.queued -= 1
+            if not acquired:
+                self.shed_queue_timeout += 1
+
+        if not acquired:
+            raise QueueTimeout("Timed out waiting for a free worker", self.retry_after())
+
+    @contextmanager
+    def admit(self, deadline=None):
+        """Hold a generation slot for the duration of the block, or shed the request."""
+        self._acquire(deadline)
+
+        with self._lock:
+            self.in_flight += 1
+            self.admitted += 1
+
+        start_time = time.monotonic()
+        outer, _abandoned.futures = getattr(_abandoned, "futures", None), []
+        try:
+            yield
+        except DeadlineExceeded:
+            with self._lock:
+                self.deadline_exceeded += 1
+            raise
+        finally:
+            pending = [future for future in _abandoned.futures if not future.done()]
+            _abandoned.futures = outer
+            if pending:
+                # Release once the last abandoned call has really finished
+                remaining = [len(pending)]
+
+                def on_done(future):
+                    with self._lock:
+                        remaining[0] -= 1
+                        last = remaining[0] == 0
+                    if last:
+                        self._release(start_time)
+
+                for future in pending:
+                    future.add_done_callback(on_done)
+            else:
+                self._release(start_time)
+
+    def _release(self, start_time):
+        elapsed = time.monotonic() - start_time
+        with self._lock:
+            self.in_flight -= 1
+            self.completed += 1
+            self.avg_service_time = 0.8 * self.avg_service_time + 0.2 * elapsed
+        self._slots.release()
+
+    def stats(self):
+        """Return queue depth and shed-request counters."""
+        with self._lock:
+            return {
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "in_flight": self.in_flight,
+                "queue_depth": self.queued,
+                "max_queue_depth": self.max_queued,
+                "admitted": self.admitted,
+                "completed": self.completed,
+                "shed_queue_full": self.shed_queue_full,
+                "shed_queue_timeout": self.shed_queue_timeout,
+                "deadline_exceeded": self.deadline_exceeded,
+                "avg_service_time": round(self.avg_service_time, 3),
+            }
@@ -139,6 +139,14 @@ class AdvancedQuestionHandler:
         
         return "another CDP"
     
+    def retrieve_documents(self, question, cdp, k=5):
+        """Retrieve the documents used as context for an advanced question."""
+        return self.vector_db.similarity_search(
+            question,
+            k=k,
+            filter={"cdp": cdp}
+        )
+    
     def handle_advanced_question(self, question, cdp):
         """Handle advanced questions about a specific CDP."""
         # Identify the type of advanced question
@@ -148,11 +156,7 @@ class AdvancedQuestionHandler:
             return None  # Not an advanced question we can handle
         
         # Retrieve relevant documents
-        docs = self.vector_db.similarity_search(
-            question,
-            k=5,
-            filter={"cdp": cdp}
-        )
+        docs = self.retrieve_documents(question, cdp)
         
         # Combine document content
         context = "\n\n".join([doc.page_content for doc in docs])
@@ -0,0 +1,270 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+def normalize_question(question):
+    """Normalize a question so trivially different repeats compare equal."""
+    question = re.sub(r"[^\w\s]", " ", question.lower())
+    return " ".join(question.split())
+
+
+def question_key(question):
+    """Stable key identifying a normalized question across runs."""
+    return hashlib.sha1(normalize_question(question).encode("utf-8")).hexdigest()[:16]
+
+
+def parse_questions(items):
+    """Turn strings, dicts or JSONL lines into {"id", "question"} items.
+
+    Items are parsed lazily, so a large input file is never held in memory.
+    Malformed items are yielded as {"id", "error"} records instead of
+    stopping the batch.
+    """
+    for i, item in enumerate(items):
+        if isinstance(item, str):
+            item = item.strip()
+            if not item:
+                continue
+            if item.startswith("{"):
+                try:
+                    item = json.loads(item)
+                except json.JSONDecodeError as e:
+                    yield {"id": str(i), "error": f"Invalid JSON: {e}"}
+                    continue
+            else:
+                item = {"question": item}
+
+        if not isinstance(item, dict):
+            yield {"id": str(i), "error": f"Expected a question string or object, got {type(item).__name__}"}
+            continue
+
+        question = str(item.get("question", "")).strip()
+        if not question:
+            continue
+        yield {"id": str(item.get("id", i)), "question": question}
+
+
+def read_completed(path):
+    """Read records already written by an earlier, possibly interrupted, run."""
+    completed = {}
+    if not path or not os.path.exists(path):
+        return completed
+
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A run that was killed mid-write can leave a partial last line
+                continue
+            if "error" not in record:
+                completed[record["id"]] = record
+    return completed
+
+
+class BatchProcessor:
+    def __init__(self, question_processor, response_generator, max_workers=4, mode="llm", window_size=512, admission=None):
+        self.question_processor = question_processor
+        self.response_generator = response_generator
+        self.max_workers = max_workers
+        self.mode = mode
+        # Unique questions classified, encoded and searched together
+        self.window_size = window_size
+        # Optional AdmissionController that every LLM call must get a slot from
+        self.admission = admission
+
+        self.stats = {}
+
+    def answer(self, question_info, retrieved_docs):
+        """Generate the answer for one unique question."""
+        if self.admission is None:
+            return self.response_generator.generate_response_with_mode(
+                question_info, retrieved_docs, mode=self.mode
+            )
+
+        with self.admission.admit():
+            return self.response_generator.generate_response_with_mode(
+                question_info, retrieved_docs, mode=self.mode
+            )
+
+    def run(self, items, completed=None):
+        """Answer a batch of questions, yielding one result record per input as it completes.
+
+        Input is read and answered in windows of window_size unique questions,
+        so output starts after the first window and memory stays flat however
+        long the input is. Exact and normalized repeats are answered once.
+        Inputs whose ids are in completed (from an earlier run) are skipped, so
+        an interrupted batch can be resumed.
+        """
+        completed = completed or {}
+        start_time = time.time()
+        self.stats = {
+            "inputs": 0,
+            "invalid": 0,
+            "skipped": 0,
+            "resumed_duplicates": 0,
+            "unique_questions": 0,
+            "duplicates": 0,
+            "errors": 0,
+            "windows": 0,
+        }
+
+        # Answers by question key, so repeats in later windows are filled in straight away
+        answered = {
+            record["key"]: {**record, "first_id": record.get("duplicate_of", record["id"])}
+            for record in completed.values() if "key" in record
+        }
+        resumed_keys = set(answered)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            window = {}
+            for item in parse_questions(items):
+                self.stats["inputs"] += 1
+                if "error" in item:
+                    self.stats["invalid"] += 1
+                    yield item
+                    continue
+                if item["id"] in completed:
+                    self.stats["skipped"] += 1
+                    continue
+
+                key = question_key(item["question"])
+                if key in answered:
+                    result = answered[key]
+                    if key in resumed_keys:
+                        self.stats["resumed_duplicates"] += 1
+                    else:
+                        self.stats["duplicates"] += 1
+                    yield self.make_record(item, result, duplicate_of=result["first_id"])
+                    continue
+                if key in window:
+                    self.stats["duplicates"] += 1
+
+                window.setdefault(key, []).append(item)
+                if len(window) >= self.window_size:
+                    yield from self.run_window(window, answered, executor)
+                    window = {}
+
+            if window:
+                yield from self.run_window(window, answered, executor)
+
+        self.stats["elapsed"] = round(time.time() - start_time, 2)
+
+    def run_window(self, groups, answered, executor):
+        """Classify, retrieve and answer one window of unique questions."""
+        self.stats["windows"] += 1
+        self.stats["unique_questions"] += len(groups)
+        keys = list(groups)
+        unique_questions = [groups[key][0]["question"] for key in keys]
+
+        # Classify and retrieve in bulk
+        question_infos = self.question_processor.classify_questions(unique_questions)
+        retrieved = self.question_processor.retrieve_documents_batch(question_infos)
+
+        # Send questions of the same type and CDP to the LLM together
+        def group_order(i):
+            question_info = question_infos[i]
+            return (question_info["type"], str(question_info.get("cdp") or question_info.get("cdps")))
+
+        order = sorted(range(len(keys)), key=group_order)
+
+        futures = {
+            executor.submit(self.answer, question_infos[i], retrieved[i] or None): i
+            for i in order
+        }
+        try:
+            for future in as_completed(futures):
+                i = futures[future]
+                question_info = question_infos[i]
+                result = {
+                    "key": keys[i],
+                    "question_type": question_info["type"],
+                    "cdp": question_info.get("cdp") or question_info.get("cdps"),
+                }
+                try:
+                    result["response"], result["mode"] = future.result()
+                except Exception as e:
+                    self.stats["errors"] += 1
+                    result["error"] = str(e)
+
+                first, *repeats = groups[keys[i]]
+                if "error" not in result:
+                    answered[keys[i]] = {**result, "first_id": first["id"]}
+
+                yield self.make_record(first, result)
+                for item in repeats:
+                    yield self.make_record(item, result, duplicate_of=first["id"])
+        finally:
+            # Don't start new LLM calls if the consumer stopped reading
+            for future in futures:
+                future.cancel()
+
+    def make_record(self, item, result, duplicate_of=None):
+        """Build the output record for one input question."""
+        record = {"id": item["id"], "question": item["question"]}
+        for field in ("key", "question_type", "cdp", "mode", "response", "error"):
+            if field in result:
+                record[field] = result[field]
+        if duplicate_of is not None:
+            record["duplicate_of"] = duplicate_of
+        return record
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer a batch of CDP questions.")
+    parser.add_argument("input", help="Text file with one question per line, or JSONL with a 'question' field ('-' for stdin)")
+    parser.add_argument("-o", "--output", required=True, help="JSONL file to write results to; existing results are resumed")
+    parser.add_argument("--workers", type=int, default=4, help="Number of concurrent LLM calls")
+    parser.add_argument("--mode", choices=["llm", "extractive", "auto"], default="llm", help="Answer mode")
+    parser.add_argument("--window", type=int, default=512, help="Unique questions classified and searched together")
+    args = parser.parse_args()
+
+    from document_processor import DocumentProcessor
+    from question_processor import QuestionProcessor
+    from response_generator import ResponseGenerator
+    from comparison_engine import ComparisonEngine
+
+    processor = DocumentProcessor()
+    vector_db = processor.load_vector_database()
+    question_processor = QuestionProcessor(vector_db)
+    response_generator = ResponseGenerator(
+        max_llm_workers=args.workers,
+        comparison_engine=ComparisonEngine(vector_db)
+    )
+    batch_processor = BatchProcessor(question_processor, response_generator, args.workers, args.mode, args.window)
+
+    completed = read_completed(args.output)
+    if completed:
+        print(f"Resuming: {len(completed)} questions already answered", file=sys.stderr)
+
+    # Finish off a partial last line left by an interrupted run
+    needs_newline = False
+    if os.path.exists(args.output) and os.path.getsize(args.output) > 0:
+        with open(args.output, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) != b"\n"
+
+    with open(args.output, "a", encoding="utf-8") as out:
+        if needs_newline:
+            out.write("\n")
+        # The input is streamed line by line rather than loaded up front
+        lines = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+        try:
+            for record in batch_processor.run(lines, completed):
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+        finally:
+            if lines is not sys.stdin:
+                lines.close()
+
+    print(f"Batch finished: {batch_processor.stats}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
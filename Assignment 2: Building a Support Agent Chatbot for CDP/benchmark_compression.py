@@ -0,0 +1,95 @@
+import argparse
+import time
+import faiss
+import numpy as np
+from document_processor import DocumentProcessor, check_pca_dim, compression_index_spec
+from example_questions import basic_questions, comparison_questions, advanced_questions, edge_case_questions
+
+# (compression, pca_dim) settings compared against the uncompressed index
+DEFAULT_SETTINGS = [
+    ("fp16", None),
+    ("sq8", None),
+    (None, 384),
+    ("fp16", 384),
+    (None, 256),
+    ("sq8", 256),
+    (None, 128),
+]
+
+
+def build_index(vectors, compression, pca_dim, metric_type):
+    """Build and fill a FAISS index for one compression setting."""
+    index = faiss.index_factory(vectors.shape[1], compression_index_spec(compression, pca_dim), metric_type)
+    index.train(vectors)
+    index.add(vectors)
+    return index
+
+
+def time_searches(index, queries, k):
+    """Search one query at a time, as the server does, returning results and per-query latencies."""
+    results = []
+    latencies = []
+    for query in queries:
+        start_time = time.perf_counter()
+        _, indices = index.search(query.reshape(1, -1), k)
+        latencies.append(time.perf_counter() - start_time)
+        results.append(indices[0])
+    return np.array(results), np.array(latencies)
+
+
+def recall_at_k(results, ground_truth, k):
+    """Fraction of the exact top-k neighbours that the compressed index also returns."""
+    hits = [len(set(found[:k]) & set(expected[:k])) / k for found, expected in zip(results, ground_truth)]
+    return float(np.mean(hits))
+
+
+def run_benchmark(load_path="vectorstore", settings=DEFAULT_SETTINGS, k=5):
+    processor = DocumentProcessor()
+    vector_db = processor.load_vector_database(load_path)
+    vectors = vector_db.index.reconstruct_n(0, vector_db.index.ntotal)
+    metric_type = vector_db.index.metric_type
+
+    questions = basic_questions + comparison_questions + advanced_questions + edge_case_questions
+    queries = np.asarray(processor.embeddings.embed_documents(questions), dtype="float32")
+
+    # The uncompressed float32 index is the baseline and the recall ground truth
+    baseline = build_index(vectors, None, None, metric_type)
+    ground_truth, baseline_latencies = time_searches(baseline, queries, k)
+
+    rows = [("float32", len(faiss.serialize_index(baseline)), baseline_latencies, 1.0)]
+    for compression, pca_dim in settings:
+        # PCA needs more training vectors than output dimensions
+        try:
+            check_pca_dim(pca_dim, *vectors.shape)
+        except ValueError as e:
+            print(f"Skipping {compression_index_spec(compression, pca_dim)}: {e}")
+            continue
+
+        index = build_index(vectors, compression, pca_dim, metric_type)
+        results, latencies = time_searches(index, queries, k)
+        rows.append((
+            compression_index_spec(compression, pca_dim),
+            len(faiss.serialize_index(index)),
+            latencies,
+            recall_at_k(results, ground_truth, k)
+        ))
+
+    print(f"{vector_db.index.ntotal} vectors, {vectors.shape[1]} dims, {len(questions)} queries\n")
+    print(f"{'Setting':<16}{'Index bytes':>14}{'Ratio':>8}{'p50 ms':>10}{'p99 ms':>10}{f'Recall@{k}':>11}")
+    baseline_bytes = rows[0][1]
+    for name, size, latencies, recall in rows:
+        print(
+            f"{name:<16}{size:>14,}{baseline_bytes / size:>7.1f}x"
+            f"{np.percentile(latencies, 50) * 1000:>10.3f}{np.percentile(latencies, 99) * 1000:>10.3f}"
+            f"{recall:>11.3f}"
+        )
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare compressed FAISS index settings.")
+    parser.add_argument("--vectorstore", default="vectorstore", help="Uncompressed vector database to benchmark")
+    parser.add_argument("-k", type=int, default=5, help="Number of neighbours for recall")
+    args = parser.parse_args()
+
+    run_benchmark(args.vectorstore, k=args.k)
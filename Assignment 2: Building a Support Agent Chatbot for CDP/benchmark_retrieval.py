@@ -0,0 +1,181 @@
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import time
+import numpy as np
+from langchain.docstore.document import Document
+from langchain.llms.fake import FakeListLLM
+from langchain.vectorstores import FAISS
+from hash_embeddings import HashEmbeddings
+from question_processor import QuestionProcessor
+from session_store import Session
+from comparison_engine import ComparisonEngine
+from example_questions import basic_questions, comparison_questions, advanced_questions
+
+BENCHMARK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_data")
+
+
+def load_advanced_question_handler():
+    """Import AdvancedQuestionHandler from its hyphenated module file."""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "advanced-question-handler.py")
+    spec = importlib.util.spec_from_file_location("advanced_question_handler", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.AdvancedQuestionHandler
+
+
+def load_json(name):
+    with open(os.path.join(BENCHMARK_DIR, name), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def build_vector_db(embeddings):
+    """Index the bundled synthetic corpus, one chunk per page."""
+    corpus = load_json("corpus.json")
+    docs = [
+        Document(page_content=page["text"], metadata={"cdp": page["cdp"], "source": page["source"]})
+        for page in corpus
+    ]
+    return FAISS.from_documents(docs, embeddings), {page["text"]: page["source"] for page in corpus}
+
+
+def interleave_by_cdp(ranked):
+    """Round-robin (cdp, source) results across CDPs, for per-CDP comparison retrieval."""
+    per_cdp = {}
+    for cdp, source in ranked:
+        per_cdp.setdefault(cdp, []).append(source)
+
+    interleaved = []
+    for rank in range(max((len(sources) for sources in per_cdp.values()), default=0)):
+        for sources in per_cdp.values():
+            if rank < len(sources):
+                interleaved.append(sources[rank])
+    return interleaved
+
+
+def score(retrieved, relevant, k):
+    """Recall@k and reciprocal rank of one ranked list of sources."""
+    unique = list(dict.fromkeys(retrieved))
+    recall = len(set(unique[:k]) & set(relevant)) / len(relevant)
+    reciprocal_rank = 0.0
+    for rank, source in enumerate(unique, start=1):
+        if source in relevant:
+            reciprocal_rank = 1.0 / rank
+            break
+    return recall, reciprocal_rank
+
+
+def measure(name, cases, retrieve, k, repeats):
+    """Run retrieve(question) for each (question, relevant sources) case and summarize."""
+    recalls = []
+    reciprocal_ranks = []
+    latencies = []
+    for question, relevant in cases:
+        for _ in range(repeats):
+            start_time = time.perf_counter()
+            retrieved = retrieve(question)
+            latencies.append(time.perf_counter() - start_time)
+
+        recall, reciprocal_rank = score(retrieved, relevant, k)
+        recalls.append(recall)
+        reciprocal_ranks.append(reciprocal_rank)
+
+    return {
+        "target": name,
+        "questions": len(cases),
+        f"recall@{k}": round(float(np.mean(recalls)), 3),
+        "mrr": round(float(np.mean(reciprocal_ranks)), 3),
+        "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 3),
+        "p99_ms": round(float(np.percentile(latencies, 99)) * 1000, 3),
+    }
+
+
+def run_benchmark(k=5, repeats=5):
+    relevance = load_json("relevance.json")
+    vector_db, source_by_text = build_vector_db(HashEmbeddings())
+
+    question_processor = QuestionProcessor(vector_db)
+    comparison_engine = ComparisonEngine(vector_db)
+    advanced_handler = load_advanced_question_handler()(FakeListLLM(responses=[""]), vector_db)
+
+    def question_processor_retrieve(question, session=None):
+        question_info = question_processor.classify_question(question)
+        docs = question_processor.retrieve_documents(question_info, top_k=k, session=session)
+        ranked = [(doc.metadata["cdp"], doc.metadata["source"]) for doc in docs]
+        if question_info["type"] == "comparison":
+            return interleave_by_cdp(ranked)
+        return [source for _, source in ranked]
+
+    def chat_retrieve(question):
+        # /api/chat always passes a session, which searches by vector instead of similarity_search
+        return question_processor_retrieve(question, Session("benchmark"))
+
+    def comparison_retrieve(question):
+        cdps = question_processor.classify_question(question).get("cdps", question_processor.cdp_names)
+        ranked = []
+        for cdp, data in comparison_engine.get_comparison_data(question, cdps).items():
+            if isinstance(data, dict):
+                ranked.extend((cdp, source_by_text[text]) for text in data["docs"])
+            else:
+                ranked.extend((cdp, doc.metadata["source"]) for doc in data)
+        return interleave_by_cdp(ranked)
+
+    def advanced_retrieve(question):
+        cdp = question_processor.identify_cdp(question)
+        return [doc.metadata["source"] for doc in advanced_handler.retrieve_documents(question, cdp, k=k)]
+
+    labelled = lambda questions: [(question, relevance[question]) for question in questions if question in relevance]
+    advanced_cases = [
+        case for case in labelled(advanced_questions)
+        if advanced_handler.identify_question_type(case[0])
+    ]
+
+    all_cases = labelled(basic_questions + comparison_questions + advanced_questions)
+    return [
+        measure("QuestionProcessor.retrieve_documents", all_cases, question_processor_retrieve, k, repeats),
+        measure("QuestionProcessor.retrieve_documents (session)", all_cases, chat_retrieve, k, repeats),
+        measure("ComparisonEngine.get_comparison_data", labelled(comparison_questions), comparison_retrieve, k, repeats),
+        measure("AdvancedQuestionHandler.retrieve_documents", advanced_cases, advanced_retrieve, k, repeats),
+    ]
+
+
+def check_thresholds(results, thresholds, k):
+    """Return a list of regressions past the configured thresholds."""
+    failures = []
+    for result in results:
+        limits = thresholds.get(result["target"], {})
+        if result[f"recall@{k}"] < limits.get("min_recall", 0):
+            failures.append(f"{result['target']}: recall@{k} {result[f'recall@{k}']} < {limits['min_recall']}")
+        if result["mrr"] < limits.get("min_mrr", 0):
+            failures.append(f"{result['target']}: MRR {result['mrr']} < {limits['min_mrr']}")
+        if result["p99_ms"] > limits.get("max_p99_ms", float("inf")):
+            failures.append(f"{result['target']}: p99 {result['p99_ms']}ms > {limits['max_p99_ms']}ms")
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline retrieval recall and latency regression benchmark.")
+    parser.add_argument("-k", type=int, default=5, help="Cut-off for recall@k")
+    parser.add_argument("--repeats", type=int, default=5, help="Timed runs per question")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.k, args.repeats)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{'Target':<50}{'Questions':>10}{f'Recall@{args.k}':>11}{'MRR':>8}{'p50 ms':>10}{'p99 ms':>10}")
+        for result in results:
+            print(
+                f"{result['target']:<50}{result['questions']:>10}{result[f'recall@{args.k}']:>11.3f}"
+                f"{result['mrr']:>8.3f}{result['p50_ms']:>10.3f}{result['p99_ms']:>10.3f}"
+            )
+
+    # Thresholds are calibrated for the default k
+    failures = check_thresholds(results, load_json("thresholds.json"), args.k) if args.k == 5 else []
+    for failure in failures:
+        print(f"REGRESSION: {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,238 @@
+import os
+import argparse
+import glob
+import hashlib
+import json
+import struct
+import time
+import zlib
+
+# Each record is a 4-byte big-endian length followed by zlib-compressed JSON
+RECORD_HEADER = struct.Struct(">I")
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class CorpusStore:
+    """Append-only store of scraped pages in compressed segment files.
+
+    Pages are appended as records (url, cdp, fetched_at, etag, sha256, text) to
+    numbered segment files, and index.jsonl records where each one starts, so
+    any page can be read with a single seek. A page that is scraped again is
+    appended rather than overwritten; the newest record for a URL wins.
+    """
+
+    def __init__(self, corpus_dir="corpus", max_segment_bytes=64 * 1024 * 1024):
+        self.corpus_dir = corpus_dir
+        self.max_segment_bytes = max_segment_bytes
+        self.index_path = os.path.join(corpus_dir, "index.jsonl")
+
+        # Newest index entry per URL
+        self.entries = {}
+        self.segment_sizes = {}
+        self.load_index()
+
+        self.appended = 0
+        self.unchanged = 0
+
+    def segment_path(self, segment):
+        return os.path.join(self.corpus_dir, f"segment-{segment:05d}.bin")
+
+    def load_index(self):
+        """Read the offset index, ignoring a line cut short by a crash."""
+        if not os.path.exists(self.index_path):
+            # Appending with no index would overwrite existing segments
+            if glob.glob(os.path.join(self.corpus_dir, "segment-*.bin")):
+                self.rebuild_index()
+            return
+
+        with open(self.index_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                self.add_entry(entry)
+
+    def add_entry(self, entry):
+        self.entries.pop(entry["url"], None)
+        self.entries[entry["url"]] = entry
+        end = entry["offset"] + entry["length"]
+        self.segment_sizes[entry["segment"]] = max(self.segment_sizes.get(entry["segment"], 0), end)
+
+    def rebuild_index(self):
+        """Recreate index.jsonl by scanning the segment files, e.g. after it was lost."""
+        self.entries = {}
+        self.segment_sizes = {}
+        entries = []
+
+        for path in sorted(glob.glob(os.path.join(self.corpus_dir, "segment-*.bin"))):
+            segment = int(os.path.basename(path)[len("segment-"):-len(".bin")])
+            with open(path, "rb") as f:
+                offset = 0
+                while True:
+                    header = f.read(RECORD_HEADER.size)
+                    if len(header) < RECORD_HEADER.size:
+                        break
+                    (length,) = RECORD_HEADER.unpack(header)
+                    try:
+                        record = json.loads(zlib.decompress(f.read(length)))
+                    except (zlib.error, json.JSONDecodeError):
+                        # Truncated final record
+                        break
+                    entry = self.index_entry(record, segment, offset + RECORD_HEADER.size, length)
+                    entries.append(entry)
+                    self.add_entry(entry)
+                    offset += RECORD_HEADER.size + length
+
+        with open(self.index_path, "w", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + "\n")
+        print(f"Rebuilt corpus index with {len(entries)} records ({len(self.entries)} pages)")
+
+    def index_entry(self, record, segment, offset, length):
+        entry = {key: record[key] for key in ("url", "cdp", "fetched_at", "etag", "sha256")}
+        entry.update({"segment": segment, "offset": offset, "length": length})
+        return entry
+
+    def append(self, url, cdp, text, etag=None, fetched_at=None):
+        """Append a page, returning its index entry, or None if its text is unchanged.
+
+        Raises ValueError if the URL is already stored for a different CDP.
+        """
+        previous = self.entries.get(url)
+        if previous is not None and previous["cdp"] != cdp:
+            raise ValueError(f"{url} is already stored for {previous['cdp']}, not {cdp}")
+
+        sha256 = content_hash(text)
+        if previous is not None and previous["sha256"] == sha256:
+            self.unchanged += 1
+            return None
+
+        record = {
+            "url": url,
+            "cdp": cdp,
+            "fetched_at": fetched_at if fetched_at is not None else time.time(),
+            "etag": etag,
+            "sha256": sha256,
+            "text": text,
+        }
+        data = zlib.compress(json.dumps(record).encode("utf-8"))
+
+        os.makedirs(self.corpus_dir, exist_ok=True)
+        segment = max(self.segment_sizes, default=1)
+        size = self.segment_sizes.get(segment, 0)
+        if size and size + RECORD_HEADER.size + len(data) > self.max_segment_bytes:
+            segment, size = segment + 1, 0
+
+        with open(self.segment_path(segment), "ab") as f:
+            # Drop any partial record left behind by an interrupted append
+            f.truncate(size)
+            f.write(RECORD_HEADER.pack(len(data)) + data)
+
+        # The index line is written last, so a record only counts once it is complete
+        entry = self.index_entry(record, segment, size + RECORD_HEADER.size, len(data))
+        with open(self.index_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+
+        self.add_entry(entry)
+        self.appended += 1
+        return entry
+
+    def read(self, entry):
+        """Read the full record for an index entry."""
+        with open(self.segment_path(entry["segment"]), "rb") as f:
+            f.seek(entry["offset"])
+            return json.loads(zlib.decompress(f.read(entry["length"])))
+
+    def get(self, url):
+        """The newest record for a URL, or None."""
+        entry = self.entries.get(url)
+        return self.read(entry) if entry is not None else None
+
+    def records(self, cdp=None):
+        """Yield the newest record of every page, optionally for one CDP.
+
+        Records are read in file order, so each segment is scanned sequentially.
+        """
+        entries = [entry for entry in self.entries.values() if cdp is None or entry["cdp"] == cdp]
+        entries.sort(key=lambda entry: (entry["segment"], entry["offset"]))
+
+        for segment in sorted({entry["segment"] for entry in entries}):
+            with open(self.segment_path(segment), "rb") as f:
+                for entry in entries:
+                    if entry["segment"] == segment:
+                        f.seek(entry["offset"])
+                        yield json.loads(zlib.decompress(f.read(entry["length"])))
+
+    def pages(self, cdp):
+        """(source URL, text) pages for one CDP, sorted by URL for stable chunking."""
+        return sorted((record["url"], record["text"]) for record in self.records(cdp))
+
+    def stats(self):
+        segment_bytes = sum(
+            os.path.getsize(self.segment_path(segment))
+            for segment in self.segment_sizes
+            if os.path.exists(self.segment_path(segment))
+        )
+        cdps = {}
+        for entry in self.entries.values():
+            cdps[entry["cdp"]] = cdps.get(entry["cdp"], 0) + 1
+
+        return {
+            "pages": len(self.entries),
+            "pages_per_cdp": cdps,
+            "segments": len(self.segment_sizes),
+            "segment_bytes": segment_bytes,
+            "appended": self.appended,
+            "unchanged": self.unchanged,
+        }
+
+def convert_directory(store, directory_path, cdp_name):
+    """Append every .txt file of a scraped documentation folder to the corpus.
+
+    The original URLs were never recorded, so each page is keyed by the CDP
+    and its path relative to the folder, e.g. "segment/overview.txt", and its
+    file modification time is used as fetched_at.
+    """
+    paths = sorted(glob.glob(os.path.join(directory_path, "**", "*.txt"), recursive=True))
+    text_bytes = 0
+    for path in paths:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            text = f.read()
+        text_bytes += len(text.encode("utf-8"))
+        # File names repeat across CDPs (overview.txt, index.txt), so the key includes the CDP
+        url = f"{cdp_name}/" + os.path.relpath(path, directory_path).replace(os.sep, "/")
+        store.append(url, cdp_name, text, fetched_at=os.path.getmtime(path))
+
+    print(f"Converted {len(paths)} files ({text_bytes:,} bytes) from {directory_path} for {cdp_name}")
+    return len(paths)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert scraped *_docs folders into a compressed corpus.")
+    parser.add_argument("folders", nargs="*", metavar="CDP=DIR",
+                        help="Folders to convert (default: the four scraped *_docs folders)")
+    parser.add_argument("--corpus", default="corpus", help="Corpus directory to append to")
+    parser.add_argument("--reindex", action="store_true", help="Rebuild index.jsonl from the segment files first")
+    args = parser.parse_args()
+
+    store = CorpusStore(args.corpus)
+    if args.reindex:
+        store.rebuild_index()
+
+    if args.folders:
+        doc_dirs = dict(folder.split("=", 1) for folder in args.folders)
+    elif args.reindex:
+        doc_dirs = {}
+    else:
+        from document_processor import CDP_DOC_DIRS
+        doc_dirs = CDP_DOC_DIRS
+
+    for cdp_name, directory_path in doc_dirs.items():
+        convert_directory(store, directory_path, cdp_name)
+
+    stats = store.stats()
+    print(
+        f"Corpus {args.corpus}: {stats['pages']} pages in {stats['segments']} segments "
+        f"({stats['segment_bytes']:,} bytes); {stats['appended']} appended, {stats['unchanged']} unchanged"
+    )
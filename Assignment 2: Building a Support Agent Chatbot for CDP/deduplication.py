@@ -0,0 +1,110 @@
+import re
+import zlib
+import numpy as np
+
+# Mersenne prime used for the MinHash permutations
+MERSENNE_PRIME = (1 << 31) - 1
+
+
+def normalize_line(line):
+    """Normalize a line so repeats differing only in whitespace compare equal."""
+    return " ".join(line.split())
+
+
+def find_boilerplate_lines(texts, min_fraction=0.5, min_pages=5, min_words=3):
+    """Find lines (navigation, footers, sidebars) that repeat across most pages of a site.
+
+    Lines with fewer than min_words words are never boilerplate, so short
+    repeated lines such as "}", "});" or "Example" in code samples and
+    headings are kept.
+    """
+    if len(texts) < min_pages:
+        return set()
+
+    page_counts = {}
+    for text in texts:
+        for line in {normalize_line(line) for line in text.splitlines()}:
+            if len(re.findall(r"[^\W\d_]{2,}", line)) >= min_words:
+                page_counts[line] = page_counts.get(line, 0) + 1
+
+    threshold = max(2, min_fraction * len(texts))
+    return {line for line, count in page_counts.items() if count >= threshold}
+
+
+def strip_boilerplate(text, boilerplate):
+    """Remove boilerplate lines from a page."""
+    if not boilerplate:
+        return text
+    return "\n".join(line for line in text.splitlines() if normalize_line(line) not in boilerplate)
+
+
+class NearDuplicateFilter:
+    def __init__(self, num_perm=64, bands=8, threshold=0.8, shingle_size=5, seed=1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+
+        random_state = np.random.RandomState(seed)
+        self.a = random_state.randint(1, MERSENNE_PRIME, size=num_perm, dtype=np.int64)
+        self.b = random_state.randint(0, MERSENNE_PRIME, size=num_perm, dtype=np.int64)
+
+    def shingles(self, text):
+        """Hash the word n-grams of a text."""
+        words = re.findall(r"\w+", text.lower())
+        if len(words) <= self.shingle_size:
+            grams = [" ".join(words)]
+        else:
+            grams = [" ".join(words[i:i + self.shingle_size]) for i in range(len(words) - self.shingle_size + 1)]
+        return np.array(sorted({zlib.crc32(gram.encode("utf-8")) & MERSENNE_PRIME for gram in grams}), dtype=np.int64)
+
+    def signature(self, text):
+        """Compute the MinHash signature of a text."""
+        hashes = self.shingles(text)
+        return ((np.outer(hashes, self.a) + self.b) % MERSENNE_PRIME).min(axis=0)
+
+    def filter(self, chunks):
+        """Drop chunks that are near-duplicates of an earlier chunk.
+
+        Candidates are found with LSH banding over the MinHash signatures and
+        confirmed by their estimated Jaccard similarity. The first chunk of each
+        group is kept and records how many duplicates were dropped. Returns the
+        kept chunks and a dict of statistics.
+        """
+        kept = []
+        kept_signatures = []
+        buckets = {}
+        removed = 0
+        removed_bytes = 0
+
+        for chunk in chunks:
+            signature = self.signature(chunk.page_content)
+            band_keys = [
+                (band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+                for band in range(self.bands)
+            ]
+
+            duplicate_of = None
+            candidates = {i for key in band_keys for i in buckets.get(key, ())}
+            for i in sorted(candidates):
+                if np.mean(kept_signatures[i] == signature) >= self.threshold:
+                    duplicate_of = i
+                    break
+
+            if duplicate_of is not None:
+                original = kept[duplicate_of]
+                original.metadata["duplicate_count"] = original.metadata.get("duplicate_count", 0) + 1
+                removed += 1
+                removed_bytes += len(chunk.page_content.encode("utf-8"))
+                continue
+
+            for key in band_keys:
+                buckets.setdefault(key, []).append(len(kept))
+            kept.append(chunk)
+            kept_signatures.append(signature)
+
+        return kept, {"chunks_removed": removed, "bytes_removed": removed_bytes}
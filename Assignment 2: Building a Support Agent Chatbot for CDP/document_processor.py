@@ -1,43 +1,228 @@
 import os
-from langchain.document_loaders import DirectoryLoader, TextLoader
+import argparse
+import glob
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import faiss
+import numpy as np
+from transformers import AutoTokenizer
+from langchain.docstore.document import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.embeddings import HuggingFaceEmbeddings
 from langchain.vectorstores import FAISS
+from deduplication import NearDuplicateFilter, find_boilerplate_lines, strip_boilerplate
+from corpus_store import CorpusStore
+
+# Scraped documentation folder for each CDP
+CDP_DOC_DIRS = {
+    "segment": "segment_docs",
+    "mparticle": "mparticle_docs",
+    "lytics": "lytics_docs",
+    "zeotap": "zeotap_docs",
+}
+
+# Per-process tokenizer, splitter and boilerplate lines used by the chunking workers
+chunk_tokenizer = None
+chunk_splitter = None
+chunk_boilerplate = frozenset()
+
+def init_chunk_worker(model_name, chunk_tokens, chunk_overlap, boilerplate=frozenset()):
+    """Load the embedding model's tokenizer and a token-sized splitter in this process."""
+    global chunk_tokenizer, chunk_splitter, chunk_boilerplate
+    chunk_boilerplate = boilerplate
+    chunk_tokenizer = AutoTokenizer.from_pretrained(model_name)
+    chunk_splitter = RecursiveCharacterTextSplitter.from_huggingface_tokenizer(
+        chunk_tokenizer,
+        chunk_size=chunk_tokens,
+        chunk_overlap=chunk_overlap
+    )
+
+def read_text_file(path):
+    """Read a scraped page, returning (source name, text)."""
+    with open(path, encoding="utf-8", errors="replace") as f:
+        return os.path.basename(path), f.read()
+
+def chunk_text(page, cdp_name):
+    """Split one page into chunks, returning the chunks and their token lengths."""
+    source, text = page
+    text = strip_boilerplate(text, chunk_boilerplate)
+    
+    document = Document(page_content=text, metadata={"source": source, "cdp": cdp_name})
+    chunks = chunk_splitter.split_documents([document])
+    lengths = [len(chunk_tokenizer.encode(chunk.page_content, add_special_tokens=False)) for chunk in chunks]
+    return chunks, lengths
 
 class DocumentProcessor:
-    def __init__(self, model_name="sentence-transformers/all-mpnet-base-v2"):
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200
-        )
+    def __init__(self, model_name="sentence-transformers/all-mpnet-base-v2", chunk_tokens=256, chunk_overlap=50, workers=None, deduplicate=True):
+        self.model_name = model_name
         self.embeddings = HuggingFaceEmbeddings(model_name=model_name)
         
-    def process_directory(self, directory_path, cdp_name):
-        """Process all text files in a directory and create documents with metadata."""
-        loader = DirectoryLoader(
-            directory_path,
-            glob="**/*.txt",
-            loader_cls=TextLoader
-        )
+        # Chunks are sized in model tokens so none get truncated when encoded
+        self.max_seq_length = self.embeddings.client.max_seq_length
+        self.chunk_tokens = min(chunk_tokens, self.max_seq_length - 2)  # room for [CLS]/[SEP]
+        self.chunk_overlap = chunk_overlap
+        self.workers = workers or os.cpu_count() or 1
+        self.chunking_stats = {}
+        
+        # Boilerplate lines and near-duplicate chunks are dropped before embedding
+        self.deduplicate = deduplicate
+        self.duplicate_filter = NearDuplicateFilter()
+        self.dedup_stats = {}
         
-        documents = loader.load()
+    def process_directory(self, directory_path, cdp_name, workers=None):
+        """Process all text files in a directory and create documents with metadata.
+        
+        Files are chunked across a pool of worker processes. Files are handled in
+        sorted order and results collected in that order, so the chunks are the
+        same regardless of the number of workers. Unless deduplication is turned
+        off, lines repeated across most pages of the site are stripped before
+        chunking and near-duplicate chunks are dropped afterwards.
+        """
+        paths = sorted(glob.glob(os.path.join(directory_path, "**", "*.txt"), recursive=True))
+        pages = [read_text_file(path) for path in paths]
+        return self.process_pages(pages, cdp_name, workers)
+    
+    def process_corpus(self, corpus, cdp_name, workers=None):
+        """Process one CDP's pages from a CorpusStore; see process_directory.
+        
+        Pages are read sequentially from the compressed segment files instead of
+        opening one file per page, and each chunk's source is the page URL.
+        """
+        return self.process_pages(corpus.pages(cdp_name), cdp_name, workers)
+    
+    def process_pages(self, pages, cdp_name, workers=None):
+        """Chunk (source name, text) pages for one CDP; see process_directory."""
+        workers = workers or self.workers
+        start_time = time.time()
+        
+        boilerplate = frozenset()
+        if self.deduplicate:
+            boilerplate = frozenset(find_boilerplate_lines([text for _, text in pages]))
+        
+        worker_args = (self.model_name, self.chunk_tokens, self.chunk_overlap, boilerplate)
+        chunk_cdp_text = partial(chunk_text, cdp_name=cdp_name)
+        if workers > 1 and len(pages) > 1:
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_chunk_worker, initargs=worker_args) as executor:
+                results = list(executor.map(chunk_cdp_text, pages, chunksize=max(1, len(pages) // (workers * 4))))
+        else:
+            init_chunk_worker(*worker_args)
+            results = [chunk_cdp_text(page) for page in pages]
+        
+        chunks = [chunk for file_chunks, _ in results for chunk in file_chunks]
+        lengths = [length for _, file_lengths in results for length in file_lengths]
+        elapsed = time.time() - start_time
+        
+        self.chunking_stats[cdp_name] = self.chunking_report(len(pages), lengths, elapsed, workers)
+        stats = self.chunking_stats[cdp_name]
+        print(f"Processed {len(pages)} documents into {len(chunks)} chunks for {cdp_name}")
+        print(
+            f"  {stats['files_per_second']} files/s with {workers} workers; chunk tokens "
+            f"min {stats['min_tokens']}, p50 {stats['p50_tokens']}, p90 {stats['p90_tokens']}, "
+            f"max {stats['max_tokens']}; {stats['over_max_seq_length']} over the model limit"
+        )
         
-        # Add metadata to each document
-        for doc in documents:
-            doc.metadata["cdp"] = cdp_name
-            doc.metadata["source"] = os.path.basename(doc.metadata["source"])
+        if self.deduplicate:
+            original_bytes = sum(len(text.encode("utf-8")) for _, text in pages)
+            stripped_bytes = original_bytes - sum(
+                len(strip_boilerplate(text, boilerplate).encode("utf-8")) for _, text in pages
+            )
+            total_chunks = len(chunks)
+            chunks, removed = self.duplicate_filter.filter(chunks)
             
-        # Split documents into chunks
-        chunks = self.text_splitter.split_documents(documents)
-        print(f"Processed {len(documents)} documents into {len(chunks)} chunks for {cdp_name}")
+            self.dedup_stats[cdp_name] = {
+                "boilerplate_lines": len(boilerplate),
+                "boilerplate_bytes_removed": stripped_bytes,
+                "chunks_before": total_chunks,
+                **removed,
+            }
+            print(
+                f"  Stripped {len(boilerplate)} boilerplate lines ({stripped_bytes:,} bytes); "
+                f"removed {removed['chunks_removed']} of {total_chunks} chunks as near-duplicates "
+                f"({removed['bytes_removed']:,} bytes)"
+            )
         
         return chunks
     
-    def create_vector_database(self, all_chunks):
-        """Create a vector database from document chunks."""
+    def chunking_report(self, file_count, lengths, elapsed, workers):
+        """Summarize chunking throughput and the chunk length distribution in tokens."""
+        lengths = np.array(lengths or [0])
+        return {
+            "files": file_count,
+            "workers": workers,
+            "seconds": round(elapsed, 2),
+            "files_per_second": round(file_count / elapsed, 1) if elapsed else 0.0,
+            "min_tokens": int(lengths.min()),
+            "p50_tokens": int(np.percentile(lengths, 50)),
+            "p90_tokens": int(np.percentile(lengths, 90)),
+            "max_tokens": int(lengths.max()),
+            "over_max_seq_length": int(np.sum(lengths > self.max_seq_length - 2)),
+        }
+    
+    def create_vector_database(self, all_chunks, compression=None, pca_dim=None):
+        """Create a vector database from document chunks.
+        
+        See compress_vector_database for the compression and pca_dim options.
+        """
+        if pca_dim:
+            # Fail before spending time on embedding rather than after
+            check_pca_dim(pca_dim, len(all_chunks), self.embeddings.client.get_sentence_embedding_dimension())
+        
+        start_time = time.time()
         vector_db = FAISS.from_documents(all_chunks, self.embeddings)
+        elapsed = time.time() - start_time
+        print(f"Embedded {len(all_chunks)} chunks in {elapsed:.1f}s")
+        
+        # Embedding time scales with chunk count, so estimate what deduplication saved
+        removed = sum(stats["chunks_removed"] for stats in self.dedup_stats.values())
+        if removed and all_chunks:
+            saved = elapsed / len(all_chunks) * removed
+            print(f"  Deduplication skipped {removed} chunks, saving about {saved:.1f}s of embedding time")
+        
+        if compression or pca_dim:
+            vector_db = self.compress_vector_database(vector_db, compression, pca_dim)
         return vector_db
     
+    def compress_vector_database(self, vector_db, compression="fp16", pca_dim=None):
+        """Rebuild the FAISS index with compressed vector storage.
+        
+        compression is "fp16" (half-precision floats), "sq8" (8-bit scalar
+        quantization) or None (full float32). With pca_dim, a PCA projection to
+        that many dimensions is trained on the stored vectors and kept in the
+        index, so queries are projected the same way at search time.
+        """
+        index_spec = compression_index_spec(compression, pca_dim)
+        vectors = vector_db.index.reconstruct_n(0, vector_db.index.ntotal)
+        check_pca_dim(pca_dim, *vectors.shape)
+        
+        index = faiss.index_factory(vectors.shape[1], index_spec, vector_db.index.metric_type)
+        index.train(vectors)
+        index.add(vectors)
+        print(f"Compressed {index.ntotal} vectors with {index_spec}")
+        
+        return FAISS(
+            vector_db.embedding_function,
+            index,
+            vector_db.docstore,
+            vector_db.index_to_docstore_id
+        )
+    
+    def build_vector_database(self, doc_dirs=CDP_DOC_DIRS, compression=None, pca_dim=None, workers=None, corpus_dir=None):
+        """Process every CDP's documentation and build one vector database.
+        
+        Pages come from the corpus in corpus_dir when one is given, and from the
+        doc_dirs folders otherwise.
+        """
+        corpus = CorpusStore(corpus_dir) if corpus_dir else None
+        all_chunks = []
+        for cdp_name, directory_path in doc_dirs.items():
+            if corpus is not None:
+                all_chunks.extend(self.process_corpus(corpus, cdp_name, workers))
+            else:
+                all_chunks.extend(self.process_directory(directory_path, cdp_name, workers))
+        
+        return self.create_vector_database(all_chunks, compression, pca_dim)
+    
     def save_vector_database(self, vector_db, save_path="vectorstore"):
         """Save the vector database to disk."""
         vector_db.save_local(save_path)
@@ -48,19 +233,37 @@ class DocumentProcessor:
         vector_db = FAISS.load_local(load_path, self.embeddings)
         return vector_db
 
+def compression_index_spec(compression=None, pca_dim=None):
+    """Build a FAISS index_factory string for a compression setting."""
+    storage = {None: "Flat", "fp16": "SQfp16", "sq8": "SQ8"}
+    if compression not in storage:
+        raise ValueError(f"Unknown compression {compression!r}, expected one of fp16, sq8")
+    
+    if pca_dim:
+        return f"PCA{pca_dim},{storage[compression]}"
+    return storage[compression]
+
+def check_pca_dim(pca_dim, ntotal, dim):
+    """Raise ValueError unless a PCA projection to pca_dim can be trained on ntotal vectors of size dim."""
+    if pca_dim and not 0 < pca_dim < min(ntotal, dim):
+        raise ValueError(
+            f"pca_dim must be positive and below both the vector count ({ntotal}) "
+            f"and the vector dimension ({dim}), got {pca_dim}"
+        )
+
 # Usage example
 if __name__ == "__main__":
-    processor = DocumentProcessor()
-    
-    # Process each CDP's documentation
-    segment_chunks = processor.process_directory("segment_docs", "segment")
-    mparticle_chunks = processor.process_directory("mparticle_docs", "mparticle")
-    lytics_chunks = processor.process_directory("lytics_docs", "lytics")
-    zeotap_chunks = processor.process_directory("zeotap_docs", "zeotap")
+    parser = argparse.ArgumentParser(description="Build the CDP documentation vector database.")
+    parser.add_argument("--compression", choices=["fp16", "sq8"], help="Store vectors compressed")
+    parser.add_argument("--pca-dim", type=int, help="Reduce vectors to this many dimensions with PCA")
+    parser.add_argument("--chunk-tokens", type=int, default=256, help="Chunk size in embedding model tokens")
+    parser.add_argument("--workers", type=int, help="Chunking worker processes (default: CPU count)")
+    parser.add_argument("--corpus", help="Read pages from this corpus directory instead of the *_docs folders")
+    parser.add_argument("--no-dedup", action="store_true", help="Keep boilerplate lines and near-duplicate chunks")
+    args = parser.parse_args()
     
-    # Combine all chunks
-    all_chunks = segment_chunks + mparticle_chunks + lytics_chunks + zeotap_chunks
+    processor = DocumentProcessor(chunk_tokens=args.chunk_tokens, workers=args.workers, deduplicate=not args.no_dedup)
     
-    # Create and save vector database
-    vector_db = processor.create_vector_database(all_chunks)
+    # Process each CDP's documentation, then create and save the vector database
+    vector_db = processor.build_vector_database(compression=args.compression, pca_dim=args.pca_dim, corpus_dir=args.corpus)
     processor.save_vector_database(vector_db)
@@ -0,0 +1,174 @@
+import math
+import re
+from collections import Counter
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from",
+    "how", "i", "in", "is", "it", "my", "of", "on", "or", "the", "to", "we", "what",
+    "which", "with", "you", "your", "this", "that", "should", "would", "between",
+    "compare", "comparison", "versus", "vs", "difference", "different", "better",
+}
+
+# Words that suggest a sentence describes an action the user should take
+STEP_VERBS = {
+    "add", "click", "select", "navigate", "go", "open", "enter", "choose", "create",
+    "configure", "enable", "install", "set", "copy", "paste", "save", "connect",
+    "define", "run", "call", "use", "specify", "update",
+}
+
+CDP_DISPLAY_NAMES = {
+    "segment": "Segment",
+    "mparticle": "mParticle",
+    "lytics": "Lytics",
+    "zeotap": "Zeotap",
+}
+
+FALLBACK_MESSAGE = (
+    "I'm specialized in answering questions about how to use Segment, mParticle, "
+    "Lytics, and Zeotap. Do you have a question about one of those CDPs?"
+)
+
+
+def tokenize(text):
+    """Split text into lowercase word tokens without stopwords."""
+    return [word for word in re.findall(r"[a-z0-9]+", text.lower()) if word not in STOPWORDS]
+
+
+def split_sentences(text):
+    """Split a document chunk into candidate sentences."""
+    sentences = []
+    for line in text.splitlines():
+        line = line.strip(" \t-*•")
+        if not line:
+            continue
+        for sentence in re.split(r"(?<=[.!?])\s+", line):
+            sentence = sentence.strip()
+            # Skip navigation fragments and very long run-on blocks
+            if 4 <= len(sentence.split()) <= 60:
+                sentences.append(sentence)
+    return sentences
+
+
+class ExtractiveAnswerer:
+    def __init__(self, comparison_engine=None, max_sentences=5):
+        self.comparison_engine = comparison_engine
+        self.max_sentences = max_sentences
+
+    def rank_sentences(self, question, docs, step_bonus=False):
+        """Rank sentences from the retrieved docs by overlap with the question.
+
+        Returns (score, doc_rank, position, sentence, cdp) tuples, best first.
+        """
+        candidates = []
+        for doc_rank, doc in enumerate(docs):
+            for position, sentence in enumerate(split_sentences(doc.page_content)):
+                candidates.append((doc_rank, position, sentence, doc.metadata.get("cdp")))
+
+        if not candidates:
+            return []
+
+        # Inverse document frequency over the candidate sentences
+        document_frequency = Counter()
+        sentence_tokens = []
+        for _, _, sentence, _ in candidates:
+            tokens = set(tokenize(sentence))
+            sentence_tokens.append(tokens)
+            document_frequency.update(tokens)
+
+        total = len(candidates)
+        question_tokens = set(tokenize(question))
+
+        ranked = []
+        seen = set()
+        for (doc_rank, position, sentence, cdp), tokens in zip(candidates, sentence_tokens):
+            key = sentence.lower()
+            if key in seen:
+                continue
+            seen.add(key)
+
+            overlap = question_tokens & tokens
+            score = sum(math.log(1 + total / document_frequency[token]) for token in overlap)
+            score /= math.sqrt(len(tokens) or 1)
+
+            # Earlier retrieval hits are more likely to be relevant
+            score *= 1.0 / (1 + 0.1 * doc_rank)
+
+            if step_bonus:
+                first_word = sentence.split()[0].lower().strip("0123456789.):")
+                if first_word in STEP_VERBS or re.match(r"^\d+[.)]", sentence):
+                    score += 0.5
+
+            ranked.append((score, doc_rank, position, sentence, cdp))
+
+        ranked.sort(key=lambda item: (-item[0], item[1], item[2]))
+        return ranked
+
+    def answer(self, question_info, retrieved_docs=None):
+        """Build an answer from the retrieved documents without calling the LLM."""
+        if not retrieved_docs or question_info["type"] == "unrelated":
+            return FALLBACK_MESSAGE
+
+        if question_info["type"] == "how-to":
+            return self.how_to_answer(question_info, retrieved_docs)
+        elif question_info["type"] == "comparison":
+            return self.comparison_answer(question_info, retrieved_docs)
+        else:
+            return self.ambiguous_answer(question_info, retrieved_docs)
+
+    def how_to_answer(self, question_info, docs):
+        """Stitch the most relevant action sentences into a step list."""
+        ranked = self.rank_sentences(question_info["question"], docs, step_bonus=True)
+        top = [item for item in ranked if item[0] > 0][:self.max_sentences]
+
+        if not top:
+            return self.ambiguous_answer(question_info, docs)
+
+        # Keep the steps in the order they appear in the documentation
+        top.sort(key=lambda item: (item[1], item[2]))
+
+        cdp_name = CDP_DISPLAY_NAMES.get(question_info["cdp"], question_info["cdp"])
+        lines = [f"Here are the relevant steps from the {cdp_name} documentation:", ""]
+        for number, (_, _, _, sentence, _) in enumerate(top, start=1):
+            lines.append(f"{number}. {sentence}")
+        return "\n".join(lines)
+
+    def comparison_answer(self, question_info, docs):
+        """Build a per-CDP comparison table from known features and retrieved docs."""
+        question = question_info["question"]
+        feature = None
+        cdp_features = {}
+        if self.comparison_engine:
+            feature = self.comparison_engine.extract_feature_from_question(question)
+            cdp_features = self.comparison_engine.cdp_features
+
+        feature_label = feature.replace("_", " ").title() if feature else "Summary"
+        lines = [f"| CDP | {feature_label} | From the documentation |", "|---|---|---|"]
+
+        for cdp in question_info["cdps"]:
+            summary = cdp_features.get(cdp, {}).get(feature, "") if feature else ""
+            cdp_docs = [doc for doc in docs if doc.metadata.get("cdp") == cdp]
+            ranked = self.rank_sentences(question, cdp_docs)
+            excerpt = ranked[0][3] if ranked and ranked[0][0] > 0 else ""
+
+            if not summary and not excerpt:
+                summary = "No information found."
+
+            cdp_name = CDP_DISPLAY_NAMES.get(cdp, cdp)
+            lines.append(f"| {cdp_name} | {summary.replace('|', '/')} | {excerpt.replace('|', '/')} |")
+
+        return "\n".join(lines)
+
+    def ambiguous_answer(self, question_info, docs):
+        """List the most relevant sentences, labelled with the CDP they came from."""
+        ranked = self.rank_sentences(question_info["question"], docs)
+        top = ranked[:self.max_sentences]
+
+        lines = ["Here is what the documentation says:", ""]
+        for _, _, _, sentence, cdp in top:
+            cdp_name = CDP_DISPLAY_NAMES.get(cdp, cdp or "Unknown")
+            lines.append(f"- **{cdp_name}**: {sentence}")
+
+        if question_info["type"] == "ambiguous":
+            lines.append("")
+            lines.append("Let me know which CDP you're using for more specific instructions.")
+        return "\n".join(lines)
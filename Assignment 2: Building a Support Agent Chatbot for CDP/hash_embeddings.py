@@ -0,0 +1,38 @@
+import re
+import zlib
+import numpy as np
+from langchain.embeddings.base import Embeddings
+
+
+class HashEmbeddings(Embeddings):
+    """Deterministic embeddings from hashed words and word pairs.
+
+    Needs no model download or network access, and gives the same vectors on
+    every machine, so retrieval benchmarks can run offline in CI. Texts that
+    share vocabulary end up close together, which is enough to catch
+    regressions in chunking, filtering and index settings.
+    """
+
+    def __init__(self, dim=384):
+        self.dim = dim
+
+    def embed(self, text):
+        words = re.findall(r"[a-z0-9]+", text.lower())
+        features = words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+
+        vector = np.zeros(self.dim, dtype="float32")
+        for feature in features:
+            hashed = zlib.crc32(feature.encode("utf-8"))
+            # The top bit decides the sign so collisions tend to cancel out
+            vector[hashed % self.dim] += 1.0 if hashed & 0x80000000 else -1.0
+
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector /= norm
+        return vector.tolist()
+
+    def embed_documents(self, texts):
+        return [self.embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self.embed(text)
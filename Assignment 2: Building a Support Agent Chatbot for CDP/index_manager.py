@@ -0,0 +1,206 @@
+import gc
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+
+
+class IndexVersion:
+    def __init__(self, name, vector_db, path):
+        self.name = name
+        self.vector_db = vector_db
+        self.path = path
+        self.readers = 0
+        self.retired = False
+        self.loaded_at = time.time()
+
+
+class VectorStoreHandle:
+    """Stand-in for a vector database that always points at a live index version.
+
+    Components such as QuestionProcessor, ComparisonEngine and
+    AdvancedQuestionHandler keep a handle as their vector_db. A request pinned
+    with IndexManager.pin() sees the same version until it finishes, even if a
+    rebuild swaps in a new one meanwhile. Unpinned access uses the current version.
+    """
+
+    def __init__(self, manager):
+        self._manager = manager
+
+    @property
+    def version(self):
+        return self._manager.version_for_thread().name
+
+    def __getattr__(self, name):
+        return getattr(self._manager.version_for_thread().vector_db, name)
+
+
+class IndexManager:
+    def __init__(self, processor, base_dir="vectorstores", legacy_path="vectorstore", keep_versions=2, build_workers=1):
+        self.processor = processor
+        self.base_dir = base_dir
+        self.legacy_path = legacy_path
+        self.keep_versions = keep_versions
+        # Rebuilds chunk in-process by default, since forking a threaded server is unsafe
+        self.build_workers = build_workers
+
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._current = None
+        self._retiring = []
+        self._on_swap = []
+
+        self.handle = VectorStoreHandle(self)
+
+        # Rebuild status
+        self.building = False
+        self.build_started_at = None
+        self.last_build_seconds = None
+        self.last_error = None
+        self.swaps = 0
+
+        self._current = self.load_current()
+
+    def pointer_path(self):
+        return os.path.join(self.base_dir, "CURRENT")
+
+    def load_current(self):
+        """Load the version named by the CURRENT pointer, or the legacy vectorstore."""
+        if os.path.exists(self.pointer_path()):
+            with open(self.pointer_path(), encoding="utf-8") as f:
+                name = f.read().strip()
+            path = os.path.join(self.base_dir, name)
+        else:
+            name, path = "legacy", self.legacy_path
+
+        print(f"Loading vector database version {name} from {path}")
+        return IndexVersion(name, self.processor.load_vector_database(path), path)
+
+    def on_swap(self, callback):
+        """Register a callback run with (old version name, new version name) after each swap."""
+        self._on_swap.append(callback)
+
+    def version_for_thread(self):
+        """The version pinned by the current thread, or the current version."""
+        version = getattr(self._local, "version", None)
+        return version if version is not None else self._current
+
+    @contextmanager
+    def pin(self):
+        """Keep the current version alive and visible to this thread for the block."""
+        if getattr(self._local, "version", None) is not None:
+            # Already pinned further up the stack
+            yield self._local.version
+            return
+
+        with self._lock:
+            version = self._current
+            version.readers += 1
+        self._local.version = version
+        try:
+            yield version
+        finally:
+            self._local.version = None
+            with self._lock:
+                version.readers -= 1
+            self.release_retired()
+
+    def swap(self, version):
+        """Atomically publish a new version; the old one is released once its readers finish."""
+        with self._lock:
+            old = self._current
+            self._current = version
+            old.retired = True
+            self._retiring.append(old)
+            self.swaps += 1
+
+        # Point CURRENT at the new version, replacing the file atomically
+        temp_path = self.pointer_path() + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(version.name)
+        os.replace(temp_path, self.pointer_path())
+
+        print(f"Swapped vector database version {old.name} -> {version.name}")
+        for callback in self._on_swap:
+            callback(old.name, version.name)
+
+        self.release_retired()
+        self.remove_old_versions()
+
+    def release_retired(self):
+        """Drop retired versions that no request is using any more."""
+        with self._lock:
+            released = [version for version in self._retiring if version.readers == 0]
+            self._retiring = [version for version in self._retiring if version.readers > 0]
+            for version in released:
+                version.vector_db = None
+
+        if released:
+            gc.collect()
+            for version in released:
+                print(f"Released vector database version {version.name}")
+
+    def remove_old_versions(self):
+        """Delete version directories beyond the newest keep_versions, never the current one."""
+        if not os.path.isdir(self.base_dir):
+            return
+
+        with self._lock:
+            in_use = {self._current.name} | {version.name for version in self._retiring}
+
+        versions = sorted(
+            name for name in os.listdir(self.base_dir)
+            if os.path.isdir(os.path.join(self.base_dir, name))
+        )
+        for name in versions[:-self.keep_versions]:
+            if name not in in_use:
+                shutil.rmtree(os.path.join(self.base_dir, name), ignore_errors=True)
+
+    def rebuild(self, **build_options):
+        """Build a new versioned index from the documentation folders and swap it in."""
+        name = time.strftime("%Y%m%d-%H%M%S")
+        path = os.path.join(self.base_dir, name)
+        start_time = time.time()
+
+        vector_db = self.processor.build_vector_database(workers=self.build_workers, **build_options)
+        self.processor.save_vector_database(vector_db, path)
+
+        self.last_build_seconds = round(time.time() - start_time, 1)
+        self.swap(IndexVersion(name, vector_db, path))
+
+    def start_rebuild(self, **build_options):
+        """Start a rebuild on a background thread. Returns False if one is already running."""
+        with self._lock:
+            if self.building:
+                return False
+            self.building = True
+            self.build_started_at = time.time()
+
+        def run():
+            try:
+                self.rebuild(**build_options)
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Vector database rebuild failed: {e}")
+            finally:
+                with self._lock:
+                    self.building = False
+
+        threading.Thread(target=run, name="index-rebuild", daemon=True).start()
+        return True
+
+    def status(self):
+        """Report the serving version, retiring versions and rebuild progress."""
+        with self._lock:
+            return {
+                "current_version": self._current.name,
+                "current_readers": self._current.readers,
+                "retiring_versions": {version.name: version.readers for version in self._retiring},
+                "building": self.building,
+                "build_started_at": self.build_started_at,
+                "last_build_seconds": self.last_build_seconds,
+                "last_error": self.last_error,
+                "swaps": self.swaps,
+            }
@@ -22,6 +22,20 @@ class QuestionProcessor:
             r"(which|what) (is|are) (better|worse|faster|easier|more|less)",
         ]
         
+        # For spotting follow-up questions in a conversation
+        self.follow_up_patterns = [
+            r"^(and|also|then|so|ok|okay)\b",
+            r"^(what|how) about\b",
+        ]
+        
+        # A pronoun alone only marks a short how-to question as a follow-up, e.g.
+        # "How do I test it?"; longer questions use "it" and "that" on their own
+        self.follow_up_pronoun_pattern = r"\b(it|that|this|them|those|these|there)\b"
+        self.follow_up_max_pronoun_words = 8
+        
+        # Cached chunks are only reused if one is at least this similar to the follow-up
+        self.follow_up_min_similarity = 0.2
+        
         # Sample how-to questions for each CDP
         self.sample_questions = {
             "segment": [
@@ -85,33 +99,47 @@ class QuestionProcessor:
     
     def identify_cdp(self, question):
         """Identify which CDP the question is about."""
+        return self.identify_cdps([question])[0]
+    
+    def identify_cdps(self, questions):
+        """Identify which CDP each question is about, vectorizing them in one pass."""
+        results = [None] * len(questions)
+        unresolved = []
+        
         # First, explicit mention check
-        question_lower = question.lower()
-        for cdp in self.cdp_names:
-            if cdp in question_lower:
-                return cdp
+        for i, question in enumerate(questions):
+            question_lower = question.lower()
+            for cdp in self.cdp_names:
+                if cdp in question_lower:
+                    results[i] = cdp
+                    break
+            else:
+                unresolved.append(i)
         
-        # If no explicit mention, use vectorizer for similarity
-        question_vector = self.vectorizer.transform([question])
+        if not unresolved:
+            return results
         
-        max_similarity = -1
-        best_cdp = None
+        # If no explicit mention, use vectorizer for similarity
+        question_vectors = self.vectorizer.transform([questions[i] for i in unresolved])
+        cdps = list(self.cdp_vectors)
+        similarities = np.column_stack([
+            cosine_similarity(question_vectors, self.cdp_vectors[cdp]).max(axis=1)
+            for cdp in cdps
+        ])
         
-        for cdp, vectors in self.cdp_vectors.items():
-            similarities = cosine_similarity(question_vector, vectors)
-            max_cdp_similarity = np.max(similarities)
-            
-            if max_cdp_similarity > max_similarity:
-                max_similarity = max_cdp_similarity
-                best_cdp = cdp
+        for row, i in enumerate(unresolved):
+            best = int(np.argmax(similarities[row]))
+            # Only return a CDP if we have reasonable confidence
+            if similarities[row, best] > 0.3:
+                results[i] = cdps[best]
         
-        # Only return a CDP if we have reasonable confidence
-        if max_similarity > 0.3:
-            return best_cdp
-        return None
+        return results
     
-    def classify_question(self, question):
-        """Classify the question type and extract relevant information."""
+    def classify_question(self, question, cdp=None):
+        """Classify the question type and extract relevant information.
+        
+        cdp can be passed when it has already been identified, e.g. by classify_questions.
+        """
         if self.is_comparison_question(question):
             # Identify which CDPs are being compared
             mentioned_cdps = [cdp for cdp in self.cdp_names if cdp in question.lower()]
@@ -127,7 +155,7 @@ class QuestionProcessor:
             }
         
         elif self.is_how_to_question(question):
-            cdp = self.identify_cdp(question)
+            cdp = cdp or self.identify_cdp(question)
             
             if cdp:
                 return {
@@ -149,36 +177,225 @@ class QuestionProcessor:
                 "question": question
             }
     
-    def retrieve_documents(self, question_info, top_k=5):
-        """Retrieve relevant documents based on the question classification."""
+    def classify_questions(self, questions):
+        """Classify many questions, identifying their CDPs in bulk."""
+        how_to_questions = [
+            question for question in questions
+            if not self.is_comparison_question(question) and self.is_how_to_question(question)
+        ]
+        cdps = dict(zip(how_to_questions, self.identify_cdps(how_to_questions)))
+        return [self.classify_question(question, cdp=cdps.get(question)) for question in questions]
+    
+    def is_follow_up_question(self, question, question_type="how-to"):
+        """Determine if the question refers back to an earlier turn."""
+        question_lower = question.lower().strip()
+        if any(re.search(pattern, question_lower) for pattern in self.follow_up_patterns):
+            return True
+        
+        return (
+            question_type == "how-to"
+            and len(question_lower.split()) <= self.follow_up_max_pronoun_words
+            and re.search(self.follow_up_pronoun_pattern, question_lower) is not None
+        )
+    
+    def resolve_follow_up(self, question_info, session=None):
+        """Carry the CDP context of the previous turn over to a follow-up question."""
+        if session is None or not session.question_info:
+            return question_info
+        
+        with session.lock:
+            previous = session.question_info
+        if previous["type"] not in ("how-to", "comparison"):
+            return question_info
+        
+        # Questions that name their own CDP stand on their own; for the rest, a
+        # follow-up wording beats the TF-IDF guess made by identify_cdp.
+        # Ambiguous questions are how-to questions with no CDP identified.
+        question = question_info["question"]
+        question_type = "how-to" if question_info["type"] == "ambiguous" else question_info["type"]
+        names_cdp = any(cdp in question.lower() for cdp in self.cdp_names)
+        if (
+            question_type in ("how-to", "unrelated")
+            and not names_cdp
+            and self.is_follow_up_question(question, question_type)
+        ):
+            resolved = {key: value for key, value in previous.items() if key in ("type", "cdp", "cdps")}
+            resolved["question"] = question
+            resolved["follow_up"] = True
+            return resolved
+        
+        return question_info
+    
+    def embed_query(self, question):
+        """Encode a question with the vector database's embedding model."""
+        return np.asarray(self.vector_db.embeddings.embed_query(question), dtype="float32")
+    
+    def get_chunk(self, position):
+        """Look up the document stored at a position of the FAISS index."""
+        doc_id = self.vector_db.index_to_docstore_id[position]
+        return self.vector_db.docstore.search(doc_id)
+    
+    def embed_queries(self, questions):
+        """Encode many questions in a single batch."""
+        return np.asarray(self.vector_db.embeddings.embed_documents(questions), dtype="float32")
+    
+    def search_by_vectors(self, query_vectors, k, cdp=None, fetch_k=20):
+        """Search the FAISS index for many query vectors in one call.
+        
+        Returns a list of (index position, document) pairs for each query vector.
+        """
+        fetch_k = k if cdp is None else max(k, fetch_k)
+        _, indices = self.vector_db.index.search(np.asarray(query_vectors, dtype="float32"), fetch_k)
+        
+        all_results = []
+        for row in indices:
+            results = []
+            for position in row:
+                if position == -1:
+                    continue
+                doc = self.get_chunk(int(position))
+                if cdp and doc.metadata.get("cdp") != cdp:
+                    continue
+                results.append((int(position), doc))
+                if len(results) == k:
+                    break
+            all_results.append(results)
+        return all_results
+    
+    def search_by_vector(self, query_vector, k, cdp=None, fetch_k=20):
+        """Search the FAISS index directly, returning (index position, document) pairs."""
+        return self.search_by_vectors([query_vector], k, cdp, fetch_k)[0]
+    
+    def search(self, question, k, cdp=None, query_vector=None):
+        """Run a similarity search, returning (index position, document) pairs.
+        
+        Positions are only known when searching by a precomputed query vector.
+        """
+        if query_vector is not None:
+            return self.search_by_vector(query_vector, k, cdp)
+        
+        search_filter = {"cdp": cdp} if cdp else None
+        docs = self.vector_db.similarity_search(question, k=k, filter=search_filter)
+        return [(None, doc) for doc in docs]
+    
+    def rerank_cached_chunks(self, question_info, session, query_vector, top_k=5):
+        """Rerank the chunks retrieved for the previous turn against a follow-up question."""
+        try:
+            vectors = np.vstack([self.vector_db.index.reconstruct(position) for position in session.chunk_ids])
+        except RuntimeError:
+            # The index type can't hand vectors back, so do a fresh search instead
+            return []
+        
+        similarities = cosine_similarity([query_vector], vectors)[0]
+        if similarities.max() < self.follow_up_min_similarity:
+            return []
+        
+        order = np.argsort(-similarities)
+        if question_info["type"] == "comparison":
+            # Keep the comparison balanced across CDPs
+            per_cdp = {}
+            results = []
+            for i in order:
+                doc = self.get_chunk(session.chunk_ids[i])
+                cdp = doc.metadata.get("cdp")
+                if per_cdp.get(cdp, 0) < 3:
+                    per_cdp[cdp] = per_cdp.get(cdp, 0) + 1
+                    results.append((session.chunk_ids[i], doc))
+            return results
+        
+        return [(session.chunk_ids[i], self.get_chunk(session.chunk_ids[i])) for i in order[:top_k]]
+    
+    def retrieve_documents(self, question_info, top_k=5, deadline=None, session=None):
+        """Retrieve relevant documents based on the question classification.
+        
+        When a session is given, the query vector and retrieved chunk ids are
+        remembered on it, and follow-up questions rerank the previous turn's
+        chunks instead of searching the whole index again.
+        """
+        if deadline:
+            deadline.check("retrieval")
+        
+        if question_info["type"] == "unrelated":
+            return []
+        
+        query_vector = None
+        # Set when the vector database is swapped at runtime (see IndexManager)
+        index_version = getattr(self.vector_db, "version", None)
+        if session is not None:
+            query_vector = self.embed_query(question_info["question"])
+            
+            # Cached chunk ids are only meaningful in the index they came from
+            with session.lock:
+                if question_info.get("follow_up") and session.chunk_ids and session.index_version == index_version:
+                    results = self.rerank_cached_chunks(question_info, session, query_vector, top_k)
+                    if results:
+                        session.reused_retrieval = True
+                        session.update(question_info, query_vector, session.chunk_ids, index_version)
+                        return [doc for _, doc in results]
+        
         if question_info["type"] == "how-to":
             # Search in the vector database with metadata filter for specific CDP
-            docs = self.vector_db.similarity_search(
-                question_info["question"],
-                k=top_k,
-                filter={"cdp": question_info["cdp"]}
-            )
-            return docs
+            results = self.search(question_info["question"], top_k, question_info["cdp"], query_vector)
             
         elif question_info["type"] == "comparison":
             # For comparison questions, get documents for each CDP
-            all_docs = []
+            results = []
             for cdp in question_info["cdps"]:
-                docs = self.vector_db.similarity_search(
-                    question_info["question"],
-                    k=3,  # Fewer per CDP since we're getting multiple
-                    filter={"cdp": cdp}
-                )
-                all_docs.extend(docs)
-            return all_docs
+                # Stop fetching more CDPs once the request has run out of time
+                if deadline:
+                    deadline.check("retrieval")
+                # Fewer per CDP since we're getting multiple
+                results.extend(self.search(question_info["question"], 3, cdp, query_vector))
             
-        elif question_info["type"] == "ambiguous":
+        else:  # ambiguous
             # Search across all CDPs
-            docs = self.vector_db.similarity_search(
-                question_info["question"],
-                k=top_k
-            )
-            return docs
-            
-        else:  # unrelated
-            return []
+            results = self.search(question_info["question"], top_k, None, query_vector)
+        
+        if session is not None:
+            session.update(question_info, query_vector, [position for position, _ in results], index_version)
+        
+        return [doc for _, doc in results]
+    
+    def retrieve_documents_batch(self, question_infos, top_k=5):
+        """Retrieve documents for many classified questions at once.
+        
+        Questions are encoded in one batch, and each CDP filter is searched
+        with a single FAISS call covering every question that needs it.
+        """
+        results = [[] for _ in question_infos]
+        pending = [i for i, question_info in enumerate(question_infos) if question_info["type"] != "unrelated"]
+        if not pending:
+            return results
+        
+        query_vectors = self.embed_queries([question_infos[i]["question"] for i in pending])
+        
+        # Group the searches by the CDP filter and result count they need
+        groups = {}
+        for i, query_vector in zip(pending, query_vectors):
+            question_info = question_infos[i]
+            if question_info["type"] == "how-to":
+                groups.setdefault((question_info["cdp"], top_k), []).append((i, query_vector))
+            elif question_info["type"] == "comparison":
+                for cdp in question_info["cdps"]:
+                    groups.setdefault((cdp, 3), []).append((i, query_vector))
+            else:  # ambiguous
+                groups.setdefault((None, top_k), []).append((i, query_vector))
+        
+        docs_by_search = {}
+        for (cdp, k), members in groups.items():
+            hits = self.search_by_vectors([query_vector for _, query_vector in members], k, cdp)
+            for (i, _), row in zip(members, hits):
+                docs_by_search[(i, cdp)] = [doc for _, doc in row]
+        
+        # Reassemble each question's documents in the same order as retrieve_documents
+        for i in pending:
+            question_info = question_infos[i]
+            if question_info["type"] == "how-to":
+                results[i] = docs_by_search[(i, question_info["cdp"])]
+            elif question_info["type"] == "comparison":
+                for cdp in question_info["cdps"]:
+                    results[i].extend(docs_by_search[(i, cdp)])
+            else:
+                results[i] = docs_by_search[(i, None)]
+        
+        return results
@@ -0,0 +1,253 @@
+import json
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+
+
+def collapse_stack(frame):
+    """Render a frame's stack root-first in collapsed (flamegraph) form."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{getattr(code, 'co_qualname', code.co_name)} ({os.path.basename(code.co_filename)})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class RequestProfile:
+    def __init__(self, profile_id):
+        self.profile_id = profile_id
+        self.tags = {}
+        self.stages = {}
+        self.samples = Counter()
+        self.started_at = time.time()
+        self.duration = None
+
+    @contextmanager
+    def stage(self, name):
+        """Time one stage of the request, e.g. retrieval or generation."""
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - start_time) * 1000
+            self.stages[name] = round(self.stages.get(name, 0) + elapsed, 2)
+
+
+class StackSampler(threading.Thread):
+    """Background thread that periodically samples the stacks of registered threads."""
+
+    def __init__(self, interval):
+        super().__init__(name="request-profiler", daemon=True)
+        self.interval = interval
+        self.profiles = {}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def register(self, thread_id, profile):
+        with self.lock:
+            self.profiles[thread_id] = profile
+
+    def unregister(self, thread_id):
+        with self.lock:
+            self.profiles.pop(thread_id, None)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            # Hold the lock so no sample lands after a request has unregistered
+            with self.lock:
+                if not self.profiles:
+                    continue
+
+                frames = sys._current_frames()
+                for thread_id, profile in self.profiles.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        profile.samples[collapse_stack(frame)] += 1
+
+
+class RequestProfiler:
+    def __init__(self, output_dir="profiles", max_profiles=200, max_bytes=50 * 1024 * 1024, interval=0.005):
+        self.output_dir = output_dir
+        self.max_profiles = max_profiles
+        self.max_bytes = max_bytes
+        self.interval = interval
+
+        # Runtime settings, changed through configure()
+        self.enabled = False
+        self.sample_rate = 0.0
+        self.slow_threshold = None
+
+        self._lock = threading.Lock()
+        self._sampler = None
+
+        # Profiles are written by a background thread so saving never adds to request latency
+        self._pending = queue.Queue(maxsize=100)
+        self._writer = threading.Thread(target=self.write_pending, name="request-profiler-writer", daemon=True)
+        self._writer.start()
+
+        self.profiled = 0
+        self.saved = 0
+        self.dropped = 0
+
+    def configure(self, enabled=None, sample_rate=None, slow_threshold=None):
+        """Change profiler settings at runtime.
+
+        sample_rate is the fraction of requests to keep regardless of latency;
+        slow_threshold (seconds) keeps every request at least that slow.
+        """
+        with self._lock:
+            if sample_rate is not None:
+                self.sample_rate = min(1.0, max(0.0, float(sample_rate)))
+            if slow_threshold is not None:
+                self.slow_threshold = float(slow_threshold) if slow_threshold else None
+            if enabled is not None:
+                self.enabled = bool(enabled)
+
+            if self.enabled and self._sampler is None:
+                self._sampler = StackSampler(self.interval)
+                self._sampler.start()
+            elif not self.enabled and self._sampler is not None:
+                self._sampler.stopped.set()
+                self._sampler = None
+
+        return self.settings()
+
+    def settings(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "sample_rate": self.sample_rate,
+                "slow_threshold": self.slow_threshold,
+                "profiled": self.profiled,
+                "saved": self.saved,
+                "dropped": self.dropped,
+            }
+
+    @contextmanager
+    def profile(self):
+        """Profile the current request thread if the profiler is on.
+
+        Yields a RequestProfile whose tags and stage timings can be filled in.
+        Stacks are always sampled while enabled, because a request can only be
+        known to be slow once it has finished; the profile is saved if the
+        request was sampled or crossed the slow threshold, and dropped otherwise.
+        """
+        profile = RequestProfile(uuid.uuid4().hex[:12])
+        sampler = self._sampler
+        if not self.enabled or sampler is None:
+            yield profile
+            return
+
+        sampled = random.random() < self.sample_rate
+        thread_id = threading.get_ident()
+        sampler.register(thread_id, profile)
+        start_time = time.perf_counter()
+        try:
+            yield profile
+        finally:
+            sampler.unregister(thread_id)
+            profile.duration = time.perf_counter() - start_time
+            with self._lock:
+                self.profiled += 1
+
+            slow = self.slow_threshold is not None and profile.duration >= self.slow_threshold
+            if (sampled or slow) and profile.samples:
+                try:
+                    self._pending.put_nowait((profile, "slow" if slow else "sampled"))
+                except queue.Full:
+                    # The writer is behind; losing a profile beats slowing the request down
+                    with self._lock:
+                        self.dropped += 1
+
+    def write_pending(self):
+        """Writer thread: save queued profiles one at a time."""
+        while True:
+            profile, reason = self._pending.get()
+            try:
+                self.save(profile, reason)
+            except OSError as e:
+                print(f"Failed to save profile {profile.profile_id}: {e}")
+
+    def save(self, profile, reason):
+        """Write a profile's collapsed stacks and metadata, then trim the ring buffer."""
+        os.makedirs(self.output_dir, exist_ok=True)
+        # Names sort in creation order, which trim() relies on
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(profile.started_at))
+        millis = int(profile.started_at * 1000) % 1000
+        base = os.path.join(self.output_dir, f"{stamp}{millis:03d}-{profile.profile_id}")
+
+        with open(base + ".folded", "w", encoding="utf-8") as f:
+            for stack, count in profile.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+        metadata = {
+            "id": profile.profile_id,
+            "reason": reason,
+            "started_at": profile.started_at,
+            "duration_ms": round(profile.duration * 1000, 2),
+            "stages_ms": profile.stages,
+            "samples": sum(profile.samples.values()),
+            **profile.tags,
+        }
+        with open(base + ".json", "w", encoding="utf-8") as f:
+            json.dump(metadata, f)
+
+        with self._lock:
+            self.saved += 1
+        self.trim()
+
+    def list_files(self):
+        """Profile file base names, oldest first."""
+        if not os.path.isdir(self.output_dir):
+            return []
+        return sorted(name[:-len(".json")] for name in os.listdir(self.output_dir) if name.endswith(".json"))
+
+    def trim(self):
+        """Delete the oldest profiles beyond the count and size limits.
+
+        Only called from the writer thread, so the disk work needs no lock and
+        never holds up requests updating the counters.
+        """
+        names = self.list_files()
+        sizes = {}
+        for name in names:
+            sizes[name] = sum(
+                os.path.getsize(os.path.join(self.output_dir, name + ext))
+                for ext in (".json", ".folded")
+                if os.path.exists(os.path.join(self.output_dir, name + ext))
+            )
+
+        total = sum(sizes.values())
+        while names and (len(names) > self.max_profiles or total > self.max_bytes):
+            oldest = names.pop(0)
+            total -= sizes[oldest]
+            for ext in (".json", ".folded"):
+                path = os.path.join(self.output_dir, oldest + ext)
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def list_profiles(self):
+        """Metadata of the stored profiles, newest first."""
+        profiles = []
+        for name in reversed(self.list_files()):
+            try:
+                with open(os.path.join(self.output_dir, name + ".json"), encoding="utf-8") as f:
+                    profiles.append({"file": name + ".folded", **json.load(f)})
+            except (OSError, json.JSONDecodeError):
+                # Removed by trim() while we were listing
+                continue
+        return profiles
+
+    def find_file(self, profile_id):
+        """File name of the collapsed stacks for a profile id, or None."""
+        for name in self.list_files():
+            if name.endswith("-" + profile_id):
+                return name + ".folded"
+        return None
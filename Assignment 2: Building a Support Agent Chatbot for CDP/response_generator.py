@@ -1,9 +1,12 @@
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from langchain.chains import LLMChain
 from langchain.prompts import PromptTemplate
 from langchain_community.llms import HuggingFaceHub
+from admission_control import DeadlineExceeded, hold_slot_until
+from extractive_answerer import ExtractiveAnswerer
 
 class ResponseGenerator:
-    def __init__(self, api_token=None):
+    def __init__(self, api_token=None, max_llm_workers=4, comparison_engine=None, llm_latency_budget=8.0):
         # Initialize LLM - use Hugging Face for this example
         self.llm = HuggingFaceHub(
             repo_id="google/flan-t5-xl",  
@@ -82,47 +85,94 @@ class ResponseGenerator:
         self.comparison_chain = LLMChain(llm=self.llm, prompt=self.comparison_template)
         self.ambiguous_chain = LLMChain(llm=self.llm, prompt=self.ambiguous_template)
         self.fallback_chain = LLMChain(llm=self.llm, prompt=self.fallback_template)
+        
+        # LLM calls run on a worker pool so a request deadline can abandon them
+        self.llm_executor = ThreadPoolExecutor(max_workers=max_llm_workers)
+        
+        # Extractive answers are served when the LLM misses its latency budget
+        self.extractive_answerer = ExtractiveAnswerer(comparison_engine)
+        self.llm_latency_budget = llm_latency_budget
     
-    def generate_response(self, question_info, retrieved_docs=None):
-        """Generate a response based on question classification and retrieved documents."""
+    def run_chain(self, chain, deadline=None, budget=None, **inputs):
+        """Run an LLM chain, giving up once the deadline or latency budget has passed."""
+        if deadline is None and budget is None:
+            return chain.run(**inputs)
+        
+        if deadline:
+            deadline.check("generation")
         
+        timeout = budget
+        if deadline is not None:
+            timeout = deadline.remaining() if budget is None else min(budget, deadline.remaining())
+        
+        future = self.llm_executor.submit(chain.run, **inputs)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            # Drop the call if it hasn't started; a running call finishes in the
+            # background and keeps the request's admission slot until it does
+            if not future.cancel():
+                hold_slot_until(future)
+            raise DeadlineExceeded("generation")
+    
+    def select_chain(self, question_info, retrieved_docs=None):
+        """Pick the LLM chain and its inputs for a classified question."""
         if question_info["type"] == "how-to" and retrieved_docs:
             # Combine document content
             context = "\n\n".join([doc.page_content for doc in retrieved_docs])
             
-            # Generate response
-            response = self.how_to_chain.run(
-                question=question_info["question"],
-                cdp=question_info["cdp"],
-                context=context
-            )
-            return response
+            return self.how_to_chain, {
+                "question": question_info["question"],
+                "cdp": question_info["cdp"],
+                "context": context
+            }
             
         elif question_info["type"] == "comparison" and retrieved_docs:
             # Combine document content
             context = "\n\n".join([f"CDP: {doc.metadata['cdp']}\n{doc.page_content}" for doc in retrieved_docs])
             
-            # Generate response
-            response = self.comparison_chain.run(
-                question=question_info["question"],
-                cdps=", ".join(question_info["cdps"]),
-                context=context
-            )
-            return response
+            return self.comparison_chain, {
+                "question": question_info["question"],
+                "cdps": ", ".join(question_info["cdps"]),
+                "context": context
+            }
             
         elif question_info["type"] == "ambiguous" and retrieved_docs:
             # Combine document content
             context = "\n\n".join([f"CDP: {doc.metadata['cdp']}\n{doc.page_content}" for doc in retrieved_docs])
             
-            # Generate response
-            response = self.ambiguous_chain.run(
-                question=question_info["question"],
-                context=context
-            )
-            return response
+            return self.ambiguous_chain, {
+                "question": question_info["question"],
+                "context": context
+            }
             
         else:  # unrelated or no docs retrieved
-            response = self.fallback_chain.run(
-                question=question_info["question"]
-            )
-            return response
+            return self.fallback_chain, {
+                "question": question_info["question"]
+            }
+    
+    def generate_response_with_mode(self, question_info, retrieved_docs=None, deadline=None, mode="llm"):
+        """Generate a response and report which mode produced it.
+        
+        mode is "llm", "extractive" or "auto". In auto mode the LLM answer is used
+        if it arrives within the latency budget, otherwise an extractive answer is
+        built from the retrieved documents. Returns a (response, mode) tuple.
+        """
+        if mode == "extractive":
+            return self.extractive_answerer.answer(question_info, retrieved_docs), "extractive"
+        
+        chain, inputs = self.select_chain(question_info, retrieved_docs)
+        
+        if mode == "auto":
+            try:
+                response = self.run_chain(chain, deadline, budget=self.llm_latency_budget, **inputs)
+                return response, "llm"
+            except DeadlineExceeded:
+                return self.extractive_answerer.answer(question_info, retrieved_docs), "extractive"
+        
+        return self.run_chain(chain, deadline, **inputs), "llm"
+    
+    def generate_response(self, question_info, retrieved_docs=None, deadline=None, mode="llm"):
+        """Generate a response based on question classification and retrieved documents."""
+        response, _ = self.generate_response_with_mode(question_info, retrieved_docs, deadline, mode)
+        return response
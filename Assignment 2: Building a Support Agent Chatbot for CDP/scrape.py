@@ -1,15 +1,23 @@
 import requests
 from bs4 import BeautifulSoup
+import argparse
 import os
 import time
+from corpus_store import CorpusStore
 
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/110.0.0.0 Safari/537.36"
 }
 
-def scrape_documentation(base_url, output_dir, link_filter="/docs/"):
-    """Scrapes documentation pages from the given base URL and saves them as text files."""
-    os.makedirs(output_dir, exist_ok=True)
+def scrape_documentation(base_url, output_dir, link_filter="/docs/", corpus=None, cdp_name=None):
+    """Scrapes documentation pages from the given base URL and saves them as text files.
+
+    If a CorpusStore is given, pages are appended to it under cdp_name instead,
+    with their URL, fetch time, ETag and content hash. Pages whose ETag or text
+    has not changed since the last scrape are skipped.
+    """
+    if corpus is None:
+        os.makedirs(output_dir, exist_ok=True)
 
     # Fetch the main documentation page
     print(f"Scraping: {base_url}")
@@ -53,7 +61,15 @@ def scrape_documentation(base_url, output_dir, link_filter="/docs/"):
     for doc_url in doc_links:
         try:
             print(f"📄 Scraping page: {doc_url}")
-            page_response = requests.get(doc_url, headers=HEADERS)
+            headers = dict(HEADERS)
+            previous = corpus.entries.get(doc_url) if corpus is not None else None
+            if previous and previous["etag"]:
+                headers["If-None-Match"] = previous["etag"]
+
+            page_response = requests.get(doc_url, headers=headers)
+            if page_response.status_code == 304:
+                print(f" Unchanged: {doc_url}")
+                continue
             if page_response.status_code != 200:
                 print(f"⚠️ Skipping {doc_url} (Status Code: {page_response.status_code})")
                 continue
@@ -72,6 +88,12 @@ def scrape_documentation(base_url, output_dir, link_filter="/docs/"):
                 print(f"⚠️ Skipping {doc_url} (No readable content found)")
                 continue
 
+            if corpus is not None:
+                entry = corpus.append(doc_url, cdp_name, content.get_text(), etag=page_response.headers.get("ETag"))
+                print(f" Saved: {doc_url}" if entry else f" Unchanged: {doc_url}")
+                time.sleep(1)  # 🕒 Avoid getting blocked
+                continue
+
             # Save extracted content
             filename = os.path.join(output_dir, doc_url.split("/")[-1] + ".txt")
             with open(filename, "w", encoding="utf-8") as f:
@@ -84,7 +106,13 @@ def scrape_documentation(base_url, output_dir, link_filter="/docs/"):
             print(f"❌ Error scraping {doc_url}: {e}")
 
 # ✅ Example Usage 
-scrape_documentation("https://segment.com/docs/", "segment_docs")
-scrape_documentation("https://docs.mparticle.com/", "mparticle_docs")
-scrape_documentation("https://www.lytics.com/docs/", "lytics_docs")
-scrape_documentation("https://www.zeotap.com/documentation/", "zeotap_docs")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape CDP documentation.")
+    parser.add_argument("--corpus", help="Append pages to this corpus directory instead of writing *_docs folders")
+    args = parser.parse_args()
+
+    corpus = CorpusStore(args.corpus) if args.corpus else None
+    scrape_documentation("https://segment.com/docs/", "segment_docs", corpus=corpus, cdp_name="segment")
+    scrape_documentation("https://docs.mparticle.com/", "mparticle_docs", corpus=corpus, cdp_name="mparticle")
+    scrape_documentation("https://www.lytics.com/docs/", "lytics_docs", corpus=corpus, cdp_name="lytics")
+    scrape_documentation("https://www.zeotap.com/documentation/", "zeotap_docs", corpus=corpus, cdp_name="zeotap")
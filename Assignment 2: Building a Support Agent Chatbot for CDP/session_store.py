@@ -0,0 +1,153 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+# Rough fixed cost of a session object and its bookkeeping, in bytes
+SESSION_OVERHEAD = 512
+
+
+class Session:
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.question_info = None
+        self.query_vector = None
+        self.chunk_ids = []
+        self.index_version = None
+        self.turns = 0
+        self.reused_retrieval = False
+        self.last_access = time.monotonic()
+        # Concurrent requests can share a session id
+        self.lock = threading.RLock()
+
+    def update(self, question_info, query_vector, chunk_ids, index_version=None):
+        """Remember the latest classification, query vector and retrieved chunk ids.
+        
+        Chunk ids are positions in the index version they were retrieved from.
+        """
+        with self.lock:
+            self.question_info = question_info
+            self.query_vector = query_vector
+            self.chunk_ids = list(chunk_ids)
+            self.index_version = index_version
+
+    def size_bytes(self):
+        """Estimate how much memory this session holds."""
+        with self.lock:
+            size = SESSION_OVERHEAD + 8 * len(self.chunk_ids)
+            if self.query_vector is not None:
+                size += self.query_vector.nbytes
+            if self.question_info:
+                size += sum(sys.getsizeof(value) for value in self.question_info.values())
+            return size
+
+
+class SessionStore:
+    def __init__(self, max_sessions=10000, ttl=1800, max_bytes=64 * 1024 * 1024):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+
+        self._sessions = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+
+        # Counters exposed through stats()
+        self.hits = 0
+        self.misses = 0
+        self.follow_ups = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _remove(self, session_id):
+        self._sessions.pop(session_id, None)
+        self.total_bytes -= self._sizes.pop(session_id, 0)
+
+    def _expired(self, session, now):
+        return now - session.last_access > self.ttl
+
+    def get(self, session_id):
+        """Return a live session, or None if it is unknown or has expired."""
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None and self._expired(session, now):
+                self._remove(session_id)
+                self.expirations += 1
+                session = None
+
+            if session is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            session.last_access = now
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def get_or_create(self, session_id):
+        """Return the existing session or start a new one."""
+        session = self.get(session_id)
+        if session is None:
+            session = Session(session_id)
+        return session
+
+    def save(self, session):
+        """Store a session after a turn, evicting old sessions to stay within limits."""
+        now = time.monotonic()
+        with session.lock:
+            size = session.size_bytes()
+            session.turns += 1
+            reused = session.reused_retrieval
+            session.reused_retrieval = False
+
+        with self._lock:
+            session.last_access = now
+            if reused:
+                self.follow_ups += 1
+
+            self._remove(session.session_id)
+            self._sessions[session.session_id] = session
+            self._sizes[session.session_id] = size
+            self.total_bytes += size
+
+            # Drop expired sessions from the cold end first
+            while self._sessions:
+                oldest_id, oldest = next(iter(self._sessions.items()))
+                if not self._expired(oldest, now):
+                    break
+                self._remove(oldest_id)
+                self.expirations += 1
+
+            # Then evict least recently used sessions until within limits
+            while len(self._sessions) > 1 and (
+                len(self._sessions) > self.max_sessions or self.total_bytes > self.max_bytes
+            ):
+                oldest_id = next(iter(self._sessions))
+                self._remove(oldest_id)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every session, e.g. after the vector database changes."""
+        with self._lock:
+            self._sessions.clear()
+            self._sizes.clear()
+            self.total_bytes = 0
+
+    def stats(self):
+        """Return session-hit and memory-usage statistics."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "memory_bytes": self.total_bytes,
+                "max_memory_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "follow_up_reuses": self.follow_ups,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
@@ -1,16 +1,103 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Response, request, jsonify, render_template, send_from_directory, stream_with_context
+import hmac
+import json
 import os
+import uuid
+from contextlib import ExitStack
 from question_processor import QuestionProcessor
 from response_generator import ResponseGenerator
-from document_processor import DocumentProcessor
+from document_processor import DocumentProcessor, compression_index_spec
+from comparison_engine import ComparisonEngine
+from admission_control import AdmissionController, AdmissionRejected, Deadline, DeadlineExceeded
+from session_store import SessionStore
+from batch_processor import BatchProcessor
+from index_manager import IndexManager
+from request_profiler import RequestProfiler
 
 app = Flask(__name__)
 
+# Admission control settings
+MAX_CONCURRENT_REQUESTS = int(os.environ.get("CHAT_MAX_CONCURRENT", 4))
+MAX_QUEUED_REQUESTS = int(os.environ.get("CHAT_MAX_QUEUE", 16))
+QUEUE_TIMEOUT = float(os.environ.get("CHAT_QUEUE_TIMEOUT", 10))
+REQUEST_TIMEOUT = float(os.environ.get("CHAT_REQUEST_TIMEOUT", 30))
+
+# Answer mode settings
+LLM_LATENCY_BUDGET = float(os.environ.get("CHAT_LLM_BUDGET", 8))
+DEFAULT_ANSWER_MODE = os.environ.get("CHAT_ANSWER_MODE", "auto")
+ANSWER_MODES = ("llm", "extractive", "auto")
+
+# Conversation session settings
+MAX_SESSIONS = int(os.environ.get("CHAT_MAX_SESSIONS", 10000))
+SESSION_TTL = float(os.environ.get("CHAT_SESSION_TTL", 1800))
+SESSION_MEMORY_MB = float(os.environ.get("CHAT_SESSION_MEMORY_MB", 64))
+
+# Batch endpoint settings; batch LLM calls get their own slots on top of CHAT_MAX_CONCURRENT
+BATCH_MAX_WORKERS = int(os.environ.get("BATCH_MAX_WORKERS", 2))
+BATCH_MAX_QUESTIONS = int(os.environ.get("BATCH_MAX_QUESTIONS", 10000))
+
+# Index rebuilds read the compressed corpus in this directory when set, else the *_docs folders
+CORPUS_DIR = os.environ.get("CORPUS_DIR")
+
+# Profiler settings; profiling itself is switched on at runtime via /api/admin/profiler
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+PROFILE_MAX_FILES = int(os.environ.get("PROFILE_MAX_FILES", 200))
+PROFILE_MAX_MB = float(os.environ.get("PROFILE_MAX_MB", 50))
+
+# Admin endpoints require this token in the X-Admin-Token header, and are disabled without it
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+
 # Initialize components
 processor = DocumentProcessor()
-vector_db = processor.load_vector_database()
+
+# Components share a handle that follows index rebuilds; requests pin one version
+index_manager = IndexManager(processor)
+vector_db = index_manager.handle
 question_processor = QuestionProcessor(vector_db)
-response_generator = ResponseGenerator()
+comparison_engine = ComparisonEngine(vector_db)
+response_generator = ResponseGenerator(
+    max_llm_workers=MAX_CONCURRENT_REQUESTS + BATCH_MAX_WORKERS,
+    comparison_engine=comparison_engine,
+    llm_latency_budget=LLM_LATENCY_BUDGET
+)
+admission = AdmissionController(
+    max_concurrent=MAX_CONCURRENT_REQUESTS,
+    max_queue=MAX_QUEUED_REQUESTS,
+    queue_timeout=QUEUE_TIMEOUT
+)
+# One batch stream at a time, and at most BATCH_MAX_WORKERS of its LLM calls in flight
+batch_streams = AdmissionController(max_concurrent=1, max_queue=0)
+batch_admission = AdmissionController(
+    max_concurrent=BATCH_MAX_WORKERS,
+    max_queue=BATCH_MAX_WORKERS,
+    queue_timeout=None
+)
+session_store = SessionStore(
+    max_sessions=MAX_SESSIONS,
+    ttl=SESSION_TTL,
+    max_bytes=int(SESSION_MEMORY_MB * 1024 * 1024)
+)
+request_profiler = RequestProfiler(
+    output_dir=PROFILE_DIR,
+    max_profiles=PROFILE_MAX_FILES,
+    max_bytes=int(PROFILE_MAX_MB * 1024 * 1024)
+)
+
+# Cached chunk ids point into the old index, so forget them after a swap
+index_manager.on_swap(lambda old_version, new_version: session_store.clear())
+
+def is_admin_request():
+    """Check the admin token, if one is configured."""
+    if not ADMIN_TOKEN:
+        return False
+    return hmac.compare_digest(request.headers.get('X-Admin-Token', ''), ADMIN_TOKEN)
+
+def overloaded_response(message, status_code, retry_after):
+    """Build an error response telling the client when to retry."""
+    response = jsonify({'error': message})
+    response.status_code = status_code
+    response.headers['Retry-After'] = str(retry_after)
+    return response
 
 @app.route('/')
 def index():
@@ -20,25 +107,203 @@ def index():
 def chat():
     data = request.json
     user_question = data.get('question', '')
-    
-    # Process the question
-    question_info = question_processor.classify_question(user_question)
-    
-    # Retrieve relevant documents
-    if question_info["type"] != "unrelated":
-        retrieved_docs = question_processor.retrieve_documents(question_info)
-    else:
-        retrieved_docs = None
-    
-    # Generate response
-    response = response_generator.generate_response(question_info, retrieved_docs)
-    
+    mode = data.get('mode', DEFAULT_ANSWER_MODE)
+    if mode not in ANSWER_MODES:
+        return jsonify({'error': f"mode must be one of {', '.join(ANSWER_MODES)}"}), 400
+
+    # Clients may ask for a tighter deadline, but never a longer one
+    try:
+        timeout = float(data.get('timeout', REQUEST_TIMEOUT))
+    except (TypeError, ValueError):
+        timeout = None
+    if timeout is None or not timeout > 0:
+        return jsonify({'error': 'timeout must be a positive number of seconds'}), 400
+    deadline = Deadline(min(timeout, REQUEST_TIMEOUT))
+
+    # Follow-up questions reuse the context of the previous turn
+    session_id = data.get('session_id') or uuid.uuid4().hex
+    if not isinstance(session_id, str):
+        return jsonify({'error': 'session_id must be a string'}), 400
+    session = session_store.get_or_create(session_id)
+
+    try:
+        with request_profiler.profile() as profile:
+            # Process the question
+            with profile.stage("classification"):
+                question_info = question_processor.classify_question(user_question)
+                question_info = question_processor.resolve_follow_up(question_info, session)
+            profile.tags.update({
+                'question_type': question_info["type"],
+                'cdp': question_info.get("cdp", None) or question_info.get("cdps", None),
+                'mode': mode
+            })
+
+            with admission.admit(deadline), index_manager.pin():
+                profile.tags['index_version'] = vector_db.version
+
+                # Retrieve relevant documents
+                with profile.stage("retrieval"):
+                    if question_info["type"] != "unrelated":
+                        retrieved_docs = question_processor.retrieve_documents(
+                            question_info, deadline=deadline, session=session
+                        )
+                        session_store.save(session)
+                    else:
+                        retrieved_docs = None
+
+                # Generate response
+                with profile.stage("generation"):
+                    response, answer_mode = response_generator.generate_response_with_mode(
+                        question_info, retrieved_docs, deadline=deadline, mode=mode
+                    )
+                profile.tags['mode'] = answer_mode
+    except AdmissionRejected as e:
+        return overloaded_response(str(e), e.status_code, e.retry_after)
+    except DeadlineExceeded as e:
+        return overloaded_response(str(e), 503, admission.retry_after())
+
     # Return the response
     return jsonify({
         'response': response,
         'question_type': question_info["type"],
+        'mode': answer_mode,
+        'session_id': session_id,
+        'follow_up': question_info.get("follow_up", False),
         'cdp': question_info.get("cdp", None) or question_info.get("cdps", None)
     })
 
+@app.route('/api/batch', methods=['POST'])
+def batch():
+    # Accept either {"questions": [...]} or a JSONL / plain-text body
+    if request.is_json:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Expected a JSON object with a questions list'}), 400
+        items = data.get('questions', [])
+        completed_ids = data.get('completed_ids', [])
+        mode = data.get('mode', 'llm')
+        if not isinstance(items, list):
+            return jsonify({'error': 'questions must be a list'}), 400
+        if not isinstance(completed_ids, list):
+            return jsonify({'error': 'completed_ids must be a list'}), 400
+        question_count = len(items)
+    else:
+        items = request.get_data(as_text=True).splitlines()
+        completed_ids = request.args.getlist('completed_id')
+        mode = request.args.get('mode', 'llm')
+        question_count = sum(1 for item in items if item.strip())
+
+    if mode not in ANSWER_MODES:
+        return jsonify({'error': f"mode must be one of {', '.join(ANSWER_MODES)}"}), 400
+    if question_count > BATCH_MAX_QUESTIONS:
+        return jsonify({'error': f"At most {BATCH_MAX_QUESTIONS} questions per batch"}), 413
+
+    # The stream slot is held until the response is closed, not just until this handler returns
+    stream_slot = ExitStack()
+    try:
+        stream_slot.enter_context(batch_streams.admit())
+    except AdmissionRejected as e:
+        return overloaded_response("Another batch is already running", e.status_code, e.retry_after)
+
+    batch_processor = BatchProcessor(
+        question_processor, response_generator, BATCH_MAX_WORKERS, mode, admission=batch_admission
+    )
+    completed = {str(record_id): {'id': str(record_id)} for record_id in completed_ids}
+
+    def generate():
+        with index_manager.pin():
+            for record in batch_processor.run(items, completed):
+                yield json.dumps(record) + "\n"
+
+    response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    response.call_on_close(stream_slot.close)
+    return response
+
+@app.route('/api/stats', methods=['GET'])
+def stats():
+    return jsonify({
+        'admission': admission.stats(),
+        'batch_admission': batch_admission.stats(),
+        'sessions': session_store.stats(),
+        'index': index_manager.status(),
+        'profiler': request_profiler.settings()
+    })
+
+@app.route('/api/admin/rebuild', methods=['POST'])
+def rebuild_index():
+    if not is_admin_request():
+        return jsonify({'error': 'Forbidden'}), 403
+
+    # Bad options would otherwise only fail after the whole corpus has been embedded
+    data = request.get_json(silent=True) or {}
+    compression = data.get('compression')
+    pca_dim = data.get('pca_dim')
+    try:
+        if pca_dim is not None:
+            pca_dim = int(str(pca_dim))
+            if pca_dim <= 0:
+                raise ValueError("pca_dim must be a positive integer")
+        compression_index_spec(compression, pca_dim)
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f"Invalid rebuild options: {e}"}), 400
+
+    started = index_manager.start_rebuild(
+        compression=compression,
+        pca_dim=pca_dim,
+        corpus_dir=CORPUS_DIR
+    )
+    if not started:
+        return jsonify({'error': 'A rebuild is already running', 'index': index_manager.status()}), 409
+    return jsonify({'index': index_manager.status()}), 202
+
+@app.route('/api/admin/index', methods=['GET'])
+def index_status():
+    if not is_admin_request():
+        return jsonify({'error': 'Forbidden'}), 403
+    return jsonify(index_manager.status())
+
+@app.route('/api/admin/profiler', methods=['GET', 'POST'])
+def profiler_settings():
+    if not is_admin_request():
+        return jsonify({'error': 'Forbidden'}), 403
+    if request.method == 'GET':
+        return jsonify(request_profiler.settings())
+
+    # Validate everything before changing anything, so a bad request changes no settings
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object'}), 400
+    enabled = data.get('enabled')
+    if enabled is not None and not isinstance(enabled, bool):
+        return jsonify({'error': 'enabled must be true or false'}), 400
+    for field in ('sample_rate', 'slow_threshold'):
+        value = data.get(field)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float))):
+            return jsonify({'error': f"{field} must be a number"}), 400
+
+    settings = request_profiler.configure(
+        enabled=enabled,
+        sample_rate=data.get('sample_rate'),
+        slow_threshold=data.get('slow_threshold')
+    )
+    return jsonify(settings)
+
+@app.route('/api/admin/profiles', methods=['GET'])
+def list_profiles():
+    if not is_admin_request():
+        return jsonify({'error': 'Forbidden'}), 403
+    return jsonify({'profiles': request_profiler.list_profiles()})
+
+@app.route('/api/admin/profiles/<profile_id>', methods=['GET'])
+def download_profile(profile_id):
+    if not is_admin_request():
+        return jsonify({'error': 'Forbidden'}), 403
+
+    filename = request_profiler.find_file(profile_id)
+    if filename is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    return send_from_directory(os.path.abspath(request_profiler.output_dir), filename,
+                               mimetype='text/plain', as_attachment=True)
+
 if __name__ == '__main__':
-    app.run(debug=True)
+    app.run(debug=True, threaded=True)